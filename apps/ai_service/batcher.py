@@ -0,0 +1,103 @@
+"""
+Micro-batching for Gemini calls.
+
+Requests that arrive within a short window are coalesced into a single batched
+call, amortizing per-request latency and prompt overhead. Each caller awaits its
+own future and receives only its slice of the batched result.
+"""
+import asyncio
+import logging
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatcher:
+    """
+    Coalesce concurrent submissions into batched handler calls.
+
+    Submissions are grouped by key (e.g. language), since only requests that can
+    share one prompt may be batched together. The handler receives the group key
+    and the list of payloads, and must return one result per payload in order.
+
+    State is kept per event loop: under WSGI every async view runs in its own
+    loop, and asyncio queues and futures cannot cross loops.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 16,
+        window: float = 0.02
+    ):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+
+    async def submit(self, payload: Any, key: Hashable = None) -> Any:
+        """Queue a payload and wait for its result from the next batch."""
+        loop = asyncio.get_running_loop()
+        groups = self._loops.setdefault(loop, {})
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'queue': asyncio.Queue(), 'drainer': None, 'batches': set()}
+
+        future = loop.create_future()
+        group['queue'].put_nowait((payload, future))
+
+        # The drainer exits once the queue is empty, so restart it on demand
+        if group['drainer'] is None or group['drainer'].done():
+            group['drainer'] = loop.create_task(self._drain(key, group))
+
+        return await future
+
+    async def _drain(self, key: Hashable, group: Dict) -> None:
+        """Collect queued payloads into batches until the queue is empty."""
+        queue = group['queue']
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if queue.empty():
+                return
+
+            # Take everything already queued, then wait up to the window for more
+            batch = []
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch without waiting so the next batch can start filling
+            task = loop.create_task(self._dispatch(key, batch))
+            group['batches'].add(task)
+            task.add_done_callback(group['batches'].discard)
+
+    async def _dispatch(self, key: Hashable, batch: List[tuple]) -> None:
+        """Run the handler for one batch and resolve each caller's future."""
+        try:
+            results = await self.handler(key, [payload for payload, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batch handler returned {len(results)} results for {len(batch)} payloads"
+                )
+        except Exception as e:
+            logger.error(f"Batched Gemini call failed for {len(batch)} requests: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
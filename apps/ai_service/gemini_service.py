@@ -2,16 +2,37 @@
 Gemini AI Integration Service
 """
 import os
+import asyncio
+import collections
+import contextvars
+import functools
+import hashlib
+import logging
+import re
+import threading
 from django.conf import settings
+from django.core.cache import cache
 import json
+import orjson
 import time
-from typing import Dict, List, Any, Optional
+import weakref
+from datetime import timedelta
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
+
+import ijson
+
+from .batcher import AsyncBatcher
+from .semantic_cache import semantic_cache
+
+
+logger = logging.getLogger(__name__)
 
 
 # Force pure-Python protobuf implementation for Python 3.14 compatibility
 os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python")
 
 
+@functools.lru_cache(maxsize=1)
 def lazy_import_genai():
     """Import and configure google.generativeai lazily to avoid import-time side effects."""
     import google.generativeai as _genai  # Local import to defer protobuf bindings
@@ -19,32 +40,781 @@ def lazy_import_genai():
     return _genai
 
 
+# grpc.aio channels are bound to the event loop that opened them, and under WSGI
+# every async view runs in a fresh loop. The SDK keeps one process-wide async
+# client, so each loop gets its own client and models instead.
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+# Every call on a loop is multiplexed over one HTTP/2 connection. Keepalive pings
+# during long calls detect a dead connection early instead of at the deadline.
+_GRPC_CHANNEL_OPTIONS = (
+    ("grpc.keepalive_time_ms", 60_000),
+    ("grpc.keepalive_timeout_ms", 20_000),
+    ("grpc.http2.max_pings_without_data", 0),
+)
+
+
+def _make_async_client():
+    """Build an async GenerativeService client whose channel uses the keepalive options."""
+    from google.generativeai import client as genai_client
+    
+    client_cls = genai_client.glm.GenerativeServiceAsyncClient
+    transport_cls = client_cls.get_transport_class('grpc_asyncio')
+    
+    def create_channel(host, **kwargs):
+        kwargs['options'] = [*kwargs.get('options', ()), *_GRPC_CHANNEL_OPTIONS]
+        return transport_cls.create_channel(host, **kwargs)
+    
+    client_config = dict(genai_client._client_manager.client_config)
+    client_config['transport'] = functools.partial(transport_cls, channel=create_channel)
+    return client_cls(**client_config)
+
+
+def _get_model(
+    model_name: str,
+    system_instruction: Optional[str] = None,
+    cached_content: Any = None
+):
+    """Return the running loop's shared GenerativeModel so its client and channel are reused."""
+    loop = asyncio.get_running_loop()
+    state = _loop_clients.get(loop)
+    if state is None:
+        lazy_import_genai()
+        state = _loop_clients[loop] = {
+            'client': _make_async_client(),
+            'models': {},
+        }
+    
+    key = (model_name, system_instruction, getattr(cached_content, 'name', None))
+    model = state['models'].get(key)
+    if model is None:
+        genai = lazy_import_genai()
+        if cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content)
+        else:
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        # Without this the model falls back to the SDK's process-wide client
+        model._async_client = state['client']
+        state['models'][key] = model
+    return model
+
+
+# Server-side context caches: (model_name, system_instruction) -> (cached_content, expires_at)
+_CONTEXT_CACHE_TTL = timedelta(days=1)
+_context_caches: Dict[tuple, tuple] = {}
+# Creation runs in worker threads; serialize it so concurrent first calls share one cache
+_context_cache_lock = threading.Lock()
+
+
+def _cached_content_entry(model_name: str, system_instruction: str) -> Optional[tuple]:
+    """Return the unexpired (cached_content, expires_at) entry, if any."""
+    entry = _context_caches.get((model_name, system_instruction))
+    if entry is not None and entry[1] > time.monotonic():
+        return entry
+    return None
+
+
+def _meets_context_cache_minimum(system_instruction: str) -> bool:
+    """Whether an instruction is long enough for Gemini to accept it as cached content."""
+    # Roughly 4 characters per token; avoids a count_tokens round-trip
+    return len(system_instruction) // 4 >= settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS
+
+
+def _get_cached_content(model_name: str, system_instruction: str):
+    """
+    Return a Gemini context cache holding a static system instruction.
+    
+    Context caching only works for some models and above a minimum token count
+    (GEMINI_CONTEXT_CACHE_MIN_TOKENS), so None is returned when the instruction
+    is too short or creation fails, and callers send the instruction inline.
+    Either result is reused until the cache TTL expires. The handle is plain
+    data, so unlike models it can be shared across event loops.
+    """
+    if not _meets_context_cache_minimum(system_instruction):
+        return None
+    
+    key = (model_name, system_instruction)
+    with _context_cache_lock:
+        entry = _cached_content_entry(model_name, system_instruction)
+        if entry is not None:
+            return entry[0]
+        
+        genai = lazy_import_genai()
+        now = time.monotonic()
+        try:
+            cached_content = genai.caching.CachedContent.create(
+                model=model_name,
+                system_instruction=system_instruction,
+                ttl=_CONTEXT_CACHE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Gemini context cache unavailable for {model_name}: {str(e)}")
+            cached_content = None
+        
+        # Refresh a little before the server-side cache expires
+        expires_at = now + _CONTEXT_CACHE_TTL.total_seconds() - 300
+        previous = _context_caches.get(key)
+        _context_caches[key] = (cached_content, expires_at)
+    
+    # Drop the replaced cache instead of leaving it to bill until its TTL runs out
+    if previous is not None and previous[0] is not None:
+        try:
+            previous[0].delete()
+        except Exception as e:
+            logger.warning(f"Failed to delete expired Gemini context cache: {str(e)}")
+    return cached_content
+
+
+# Outbound concurrency limit, one semaphore per event loop (async views under
+# WSGI each run in their own loop, and asyncio primitives are loop-bound)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _concurrency_limit() -> asyncio.Semaphore:
+    """Return the Gemini semaphore for the running loop so bursts queue instead of hitting 429s."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+    return semaphore
+
+
+class GeminiCapacityError(Exception):
+    """The global Gemini request budget is used up; retry after retry_after seconds."""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Gemini request budget exhausted, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+async def _take_rate_token() -> None:
+    """
+    Count one outbound call against the per-minute budget shared by all workers.
+    
+    A fixed-window counter in the shared cache (atomic INCR on Redis). Failing fast
+    leaves the client to retry instead of piling up calls that Gemini would reject.
+    """
+    limit = settings.GEMINI_RATE_LIMIT_PER_MINUTE
+    if not limit:
+        return
+    
+    now = time.time()
+    key = f"gemini:rate:{int(now // 60)}"
+    await cache.aadd(key, 0, 120)
+    try:
+        count = await cache.aincr(key)
+    except ValueError:
+        # The window expired between add and incr
+        await cache.aset(key, 1, 120)
+        count = 1
+    if count > limit:
+        raise GeminiCapacityError(retry_after=60 - int(now % 60))
+
+
+class GeminiResponseError(Exception):
+    """The model's response was unusable (truncated or not valid JSON): a server-side failure."""
+
+
+def _hit_token_limit(response) -> bool:
+    """Whether generation stopped at max_output_tokens, leaving the output cut off."""
+    candidates = getattr(response, 'candidates', None) or []
+    finish_reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+    return getattr(finish_reason, 'name', finish_reason) == 'MAX_TOKENS'
+
+
+# Markdown code fence that models sometimes wrap JSON output in
+_FENCE_RE = re.compile(r'^\s*(?:```(?:json)?\s*)?(.*?)\s*(?:```)?\s*$', re.S)
+
+
+# Shared response cache (Redis in production, locmem in development)
+_response_cache = cache
+
+# Hit/miss outcome of each Gemini call made while handling the current request
+_cache_events: contextvars.ContextVar[Optional[List[bool]]] = contextvars.ContextVar(
+    'gemini_cache_events', default=None
+)
+
+
+def track_cache_events() -> List[bool]:
+    """
+    Start recording cache outcomes for the current context.
+    
+    The list is shared with tasks spawned from this context (e.g. by gather),
+    so it collects every call made on behalf of one request.
+    """
+    events = []
+    _cache_events.set(events)
+    return events
+
+
+def _record_cache_event(hit: bool) -> None:
+    events = _cache_events.get()
+    if events is not None:
+        events.append(hit)
+
+
+def _response_cache_key(
+    prompt: str,
+    model_name: str,
+    response_schema: Optional[Dict],
+    use_search: bool,
+    system_instruction: Optional[str] = None,
+    max_output_tokens: Optional[int] = None
+) -> str:
+    """Build a stable cache key for a Gemini request."""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "prompt": prompt,
+            "schema": response_schema,
+            "search": use_search,
+            "system": system_instruction,
+            "max_output_tokens": max_output_tokens,
+        },
+        sort_keys=True
+    )
+    return 'gemini:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _interaction_cache_key(canonical_set: Tuple[str, ...], language: str) -> str:
+    """Cache key for the interactions of one canonical medication set."""
+    payload = json.dumps({"medications": canonical_set, "language": language})
+    return 'gemini:interactions:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _semantic_cache_namespace(
+    model_name: str,
+    response_schema: Optional[Dict],
+    system_instruction: Optional[str],
+    scope: str
+) -> str:
+    """Group semantically cached prompts by endpoint and exact-match scope (e.g. language)."""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "schema": response_schema,
+            "system": system_instruction,
+            "scope": scope,
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+_LANG_MAP = {
+    'uz-L': 'Uzbek (Latin script)',
+    'uz-C': 'Uzbek (Cyrillic script)',
+    'ru': 'Russian',
+    'en': 'English'
+}
+
+# Map specialties to AI models
+_SPECIALTY_TO_MODEL = {
+    'Cardiology': 'Gemini',
+    'Neurology': 'Claude',
+    'Radiology': 'GPT',
+    'Oncology': 'Llama',
+    'Endocrinology': 'Grok',
+    # Default mappings for other specialties
+    'Gastroenterology': 'Gemini',
+    'Pulmonology': 'GPT',
+    'Nephrology': 'Gemini',
+    'Rheumatology': 'Claude',
+    'Infectious Disease': 'Llama',
+    'Hematology': 'Llama',
+    'Geriatrics': 'Gemini',
+    'Emergency Medicine': 'GPT',
+    'Internal Medicine': 'Gemini',
+    'Pediatrics': 'Claude',
+    'Dermatology': 'GPT',
+    'Orthopedics': 'GPT',
+    'Urology': 'Gemini',
+    'Gynecology': 'Gemini',
+    'Psychiatry': 'Claude',
+}
+
+
+# Prompt templates (filled with str.format at call time)
+_CLARIFYING_QUESTIONS_TEMPLATE = """
+Based on the following patient information, generate 1-{max_questions} clarifying
+questions that would help in making a more accurate diagnosis.
+
+Patient Information:
+- Complaints: {complaints}
+- History: {history}
+- Objective Data: {objectiveData}
+- Lab Results: {labResults}
+
+Return the questions in {target_lang} language as a JSON array of strings.
+Format: {{"questions": ["Question 1?", "Question 2?", ...]}}
+"""
+
+_CLARIFYING_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    },
+    "required": ["questions"]
+}
+
+# Output budget per clarifying question; non-Latin scripts need more tokens
+_QUESTION_TOKEN_BUDGET = 60
+
+
+def _clarifying_questions_token_limit(max_items: int) -> int:
+    """Cap generated tokens to what max_items questions plus JSON framing need."""
+    return 32 + max_items * _QUESTION_TOKEN_BUDGET
+
+
+# Static instructions are sent as a cached system instruction, so only the
+# patient-specific part of the prompt is tokenized on every call
+_RECOMMEND_SPECIALISTS_INSTRUCTION = """
+You are a medical consultation coordinator. Based on the patient's condition, symptoms, and clinical data, 
+recommend 5-6 MEDICAL SPECIALTIES (not AI models) that are MOST RELEVANT and NECESSARY for this specific case.
+
+IMPORTANT: The specialty selection MUST be based on the DISEASE/SYMPTOM TYPE. Different diseases require 
+different specialist teams. DO NOT recommend a generic team - tailor it to the specific medical condition.
+
+CRITICAL: Recommend MEDICAL SPECIALTIES (e.g., "Cardiology", "Neurology", "Radiology", etc.), NOT AI model names.
+The AI models will be assigned to these specialties automatically by the system.
+
+Available Medical Specialties (use EXACT names):
+- "Cardiology" (Heart and cardiovascular diseases, chest pain, hypertension, arrhythmias)
+- "Neurology" (Brain, nerves, headaches, seizures, neurological conditions)
+- "Radiology" (Medical imaging interpretation, X-rays, CT scans, MRIs, ultrasound)
+- "Oncology" (Cancer, tumors, malignancies, cancer diagnosis and treatment)
+- "Endocrinology" (Hormones, diabetes, thyroid disorders, metabolic conditions)
+- "Gastroenterology" (Digestive system, liver, stomach, intestines)
+- "Pulmonology" (Lungs, respiratory system, breathing disorders)
+- "Nephrology" (Kidneys, renal diseases, dialysis)
+- "Rheumatology" (Joints, autoimmune diseases, arthritis)
+- "Infectious Disease" (Infections, bacterial/viral diseases, antibiotics)
+- "Hematology" (Blood disorders, anemia, clotting problems)
+- "Geriatrics" (Elderly care, age-related conditions)
+- "Emergency Medicine" (Acute care, trauma, critical conditions)
+- "Internal Medicine" (General medicine, complex multi-system diseases)
+- "Pediatrics" (Children's health, pediatric conditions)
+- "Dermatology" (Skin conditions, dermatological diseases)
+- "Orthopedics" (Bones, joints, fractures, musculoskeletal)
+- "Urology" (Urinary system, kidneys, bladder)
+- "Gynecology" (Women's reproductive health)
+- "Psychiatry" (Mental health, psychological conditions)
+
+Analysis Instructions:
+1. Identify the PRIMARY disease/symptom category (e.g., cardiovascular, neurological, gastrointestinal, respiratory, oncological, endocrine, etc.)
+2. Select 5-6 MEDICAL SPECIALTIES (not AI models) that directly relate to the identified condition and its complications
+3. Consider related organ systems and potential comorbidities
+4. Prioritize specialties based on disease relevance - the most important specialties first
+5. For each specialty, provide a clear reason explaining why this medical specialty is needed for THIS SPECIFIC CASE and how it relates to the disease/symptoms
+
+Examples:
+- For chest pain + cardiac symptoms → Recommend: Cardiology (primary), Radiology (for imaging), Emergency Medicine (if acute), etc.
+- For headache + neurological symptoms → Recommend: Neurology (primary), Radiology (for brain imaging), Emergency Medicine (if severe), etc.
+- For suspected cancer/tumor → Recommend: Oncology (primary), Radiology (for imaging), relevant organ specialty (e.g., Gastroenterology for GI cancer), etc.
+- For diabetes/metabolic issues → Recommend: Endocrinology (primary), Cardiology (complications), Nephrology (kidney complications), etc.
+
+Return recommendations with this JSON format:
+{
+    "recommendations": [
+        {
+            "specialty": "Cardiology",
+            "reason": "Detailed explanation why this specialty is needed for this specific case"
+        }
+    ]
+}
+
+Make sure to return exactly 5-6 specialty recommendations based on disease-specific needs.
+DO NOT include AI model names in your response - only medical specialties.
+"""
+
+_RECOMMEND_SPECIALISTS_TEMPLATE = """
+Patient Information:
+- Age: {age}
+- Gender: {gender}
+- Chief Complaints (Symptoms): {complaints}
+- Medical History: {history}
+- Objective Physical Examination Data: {objectiveData}
+- Laboratory Results: {labResults}
+- Current Medications: {currentMedications}
+- Additional Information: {additionalInfo}
+
+Return the recommendations in {target_lang}.
+"""
+
+_RECOMMEND_SPECIALISTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "specialty": {"type": "string"},
+                    "reason": {"type": "string"}
+                },
+                "required": ["specialty", "reason"]
+            },
+            "minItems": 5,
+            "maxItems": 6
+        }
+    },
+    "required": ["recommendations"]
+}
+
+_INITIAL_DIAGNOSES_INSTRUCTION = """
+Based on the patient information, generate 3-5 differential diagnoses
+with probability estimates and justification.
+
+Return them with this JSON format:
+{
+    "diagnoses": [
+        {
+            "name": "Diagnosis name",
+            "probability": 0.75,
+            "justification": "Why this diagnosis is likely",
+            "evidenceLevel": "High/Moderate/Low"
+        }
+    ]
+}
+"""
+
+_INITIAL_DIAGNOSES_TEMPLATE = """
+Patient Information:
+- Name: {firstName} {lastName}
+- Age: {age}
+- Gender: {gender}
+- Complaints: {complaints}
+- History: {history}
+- Objective Data: {objectiveData}
+- Lab Results: {labResults}
+
+Return the diagnoses in {target_lang}.
+"""
+
+_INITIAL_DIAGNOSES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "diagnoses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "probability": {"type": "number"},
+                    "justification": {"type": "string"},
+                    "evidenceLevel": {"type": "string"}
+                },
+                "required": ["name", "probability", "justification", "evidenceLevel"]
+            }
+        }
+    },
+    "required": ["diagnoses"]
+}
+
+_FINAL_REPORT_TEMPLATE = """
+Generate a comprehensive medical report based on the AI council discussion.
+
+Patient: {firstName} {lastName}
+Age: {age}, Gender: {gender}
+
+Chief Complaints: {complaints}
+
+Differential Diagnoses Considered:
+{diagnoses}
+
+Debate Summary:
+{debate_summary}
+
+Generate a complete report in {target_lang} with:
+- Consensus diagnosis (most likely diagnoses with probability)
+- Rejected hypotheses and why
+- Recommended tests
+- Treatment plan
+- Medication recommendations
+- Follow-up plan
+- Prognosis
+- Any unexpected findings
+
+Return as structured JSON.
+"""
+
+_FINAL_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "consensusDiagnosis": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "probability": {"type": "number"},
+                    "justification": {"type": "string"},
+                    "evidenceLevel": {"type": "string"}
+                }
+            }
+        },
+        "rejectedHypotheses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "reason": {"type": "string"}
+                }
+            }
+        },
+        "recommendedTests": {
+            "type": "array",
+            "items": {"type": "string"}
+        },
+        "treatmentPlan": {
+            "type": "array",
+            "items": {"type": "string"}
+        },
+        "medicationRecommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "dosage": {"type": "string"},
+                    "notes": {"type": "string"}
+                }
+            }
+        },
+        "unexpectedFindings": {"type": "string"}
+    }
+}
+
+_DRUG_INTERACTIONS_TEMPLATE = """
+Check for potential drug interactions within each of the following
+numbered medication sets. Treat every set independently:
+{sets}
+
+Return interactions in {target_lang} with JSON format, one entry per set,
+using the set number as "index":
+{{
+    "results": [
+        {{
+            "index": 1,
+            "interactions": [
+                {{
+                    "interaction": "Drug A + Drug B",
+                    "severity": "High/Medium/Low",
+                    "mechanism": "How they interact",
+                    "management": "What to do"
+                }}
+            ]
+        }}
+    ]
+}}
+"""
+
+_DRUG_INTERACTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "interactions": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "interaction": {"type": "string"},
+                                "severity": {"type": "string"},
+                                "mechanism": {"type": "string"},
+                                "management": {"type": "string"}
+                            }
+                        }
+                    }
+                },
+                "required": ["index", "interactions"]
+            }
+        }
+    },
+    "required": ["results"]
+}
+
+_CME_TOPICS_TEMPLATE = """
+Based on these recent cases: {diagnoses}
+
+Suggest 3-5 CME (Continuing Medical Education) topics that would be
+most relevant for this physician in {target_lang}.
+
+Return as JSON:
+{{
+    "topics": [
+        {{
+            "topic": "Topic name",
+            "relevance": "Why this is relevant"
+        }}
+    ]
+}}
+"""
+
+_CME_TOPICS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "topics": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "topic": {"type": "string"},
+                    "relevance": {"type": "string"}
+                }
+            }
+        }
+    }
+}
+
+
+async def _resolve_model(model_name: str, system_instruction: Optional[str] = None):
+    """Return the shared model for a call, using a context cache for static instructions."""
+    cached_content = None
+    if system_instruction:
+        entry = _cached_content_entry(model_name, system_instruction)
+        if entry is not None:
+            cached_content = entry[0]
+        elif _meets_context_cache_minimum(system_instruction):
+            # Creating a context cache is a blocking network call
+            cached_content = await asyncio.to_thread(
+                _get_cached_content, model_name, system_instruction
+            )
+    return _get_model(model_name, system_instruction, cached_content)
+
+
+def _canonical_medications(medications: List[str]) -> List[str]:
+    """Normalize a medication set so permutations share a prompt and cache key."""
+    return sorted({m.strip().lower() for m in medications if m and m.strip()})
+
+
+# Fallbacks for patient fields referenced by the prompt templates
+_PATIENT_DEFAULTS = {
+    'firstName': '',
+    'lastName': '',
+    'age': 'Not provided',
+    'gender': 'Not provided',
+    'complaints': 'Not provided',
+    'history': 'Not provided',
+    'objectiveData': 'Not provided',
+    'labResults': 'Not provided',
+    'currentMedications': 'Not provided',
+    'additionalInfo': 'Not provided',
+}
+
+
+def _patient_context(patient_data: Dict, target_lang: str) -> collections.ChainMap:
+    """Layer patient data over the defaults for use with str.format_map()."""
+    return collections.ChainMap({'target_lang': target_lang}, patient_data, _PATIENT_DEFAULTS)
+
+
+_CLINICAL_FIELDS = ('complaints', 'history', 'objectiveData', 'labResults')
+
+
+def _clinical_summary(patient_data: Dict) -> str:
+    """The patient-specific part of a prompt, for semantic cache comparison."""
+    return "\n".join(
+        f"{field}: {patient_data.get(field) or ''}" for field in _CLINICAL_FIELDS
+    )
+
+
+def _is_empty_patient_data(patient_data: Dict) -> bool:
+    """True when no clinical field carries real content, so the model can only return boilerplate."""
+    for field in _CLINICAL_FIELDS:
+        value = patient_data.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+            if value == 'Not provided':
+                continue
+        if value:
+            return False
+    return True
+
+
 class GeminiService:
     """Service class for interacting with Gemini AI."""
     
     def __init__(self):
         # Defer model creation to call time to avoid import-time failures
         self.default_model_name = 'gemini-2.0-flash-exp'
+        self.cache_stats = {'hits': 0, 'semantic_hits': 0, 'misses': 0}
+        # Concurrent single-set checks from the same user share one batched prompt
+        self._interaction_batcher = AsyncBatcher(
+            self._check_interaction_batch,
+            max_batch_size=settings.GEMINI_BATCH_MAX_SIZE,
+            window=settings.GEMINI_BATCH_WINDOW_MS / 1000
+        )
     
-    def _call_gemini(
+    async def _call_gemini(
         self,
         prompt: str,
         model_name: str = 'gemini-2.0-flash-exp',
         response_schema: Optional[Dict] = None,
-        use_search: bool = False
+        use_search: bool = False,
+        system_instruction: Optional[str] = None,
+        max_output_tokens: Optional[int] = None,
+        semantic_key: Optional[Tuple[str, str]] = None,
+        use_cache: bool = True
     ) -> Any:
         """
-        Call Gemini AI API.
+        Call Gemini AI API asynchronously.
         
         Args:
             prompt: The prompt to send
             model_name: Model to use
             response_schema: JSON schema for structured output
             use_search: Whether to use Google Search
+            system_instruction: Static instruction served from a context cache
+            max_output_tokens: Upper bound on generated tokens
+            semantic_key: (scope, text) to opt into the semantic cache; the scope
+                must match exactly and only the text is compared by embedding
+            use_cache: Set to False when the caller caches the parsed result itself
         
         Returns:
             Response text or parsed JSON
         """
+        model_name = model_name or self.default_model_name
+        
+        # Search-grounded responses are non-deterministic, so never cache them
+        cache_key = None
+        semantic_namespace = semantic_embedding = None
+        if use_cache and not use_search:
+            cache_key = _response_cache_key(
+                prompt, model_name, response_schema, use_search, system_instruction,
+                max_output_tokens
+            )
+            cached = await _response_cache.aget(cache_key)
+            if cached is not None:
+                self.cache_stats['hits'] += 1
+                _record_cache_event(True)
+                return cached
+            
+            # Fall back to near-duplicate requests for endpoints that opted in
+            if semantic_key is not None and semantic_cache.enabled:
+                scope, semantic_text = semantic_key
+                semantic_namespace = _semantic_cache_namespace(
+                    model_name, response_schema, system_instruction, scope
+                )
+                cached, semantic_embedding = await asyncio.to_thread(
+                    semantic_cache.lookup, semantic_namespace, semantic_text
+                )
+                if cached is not None:
+                    self.cache_stats['semantic_hits'] += 1
+                    _record_cache_event(True)
+                    return cached
+            self.cache_stats['misses'] += 1
+        
+        _record_cache_event(False)
+        await _take_rate_token()
+        
         try:
             config = {}
 
@@ -55,313 +825,283 @@ class GeminiService:
             if use_search:
                 config['tools'] = [{'google_search': {}}]
 
+            if max_output_tokens:
+                config['max_output_tokens'] = max_output_tokens
+
             genai = lazy_import_genai()
-            model = genai.GenerativeModel(model_name or self.default_model_name)
+            model = await _resolve_model(model_name, system_instruction)
 
             generation_config = genai.types.GenerationConfig(**config) if config else None
 
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+            async with _concurrency_limit():
+                response = await model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    request_options={'timeout': settings.GEMINI_REQUEST_TIMEOUT}
+                )
 
+            if _hit_token_limit(response):
+                raise GeminiResponseError("Gemini response truncated at max_output_tokens")
+            
             text = response.text
             
             if response_schema:
-                # Clean and parse JSON
-                cleaned_text = text.strip()
-                if cleaned_text.startswith('```json'):
-                    cleaned_text = cleaned_text[7:]
-                if cleaned_text.endswith('```'):
-                    cleaned_text = cleaned_text[:-3]
-                cleaned_text = cleaned_text.strip()
-                
+                # JSON mode normally returns bare JSON, so only clean up on failure
                 try:
-                    return json.loads(cleaned_text)
-                except json.JSONDecodeError as e:
-                    print(f"Failed to parse JSON: {e}")
-                    print(f"Response: {cleaned_text}")
-                    raise ValueError("Received invalid JSON from API")
+                    result = orjson.loads(text)
+                except orjson.JSONDecodeError:
+                    cleaned_text = _FENCE_RE.match(text).group(1)
+                    
+                    try:
+                        result = orjson.loads(cleaned_text)
+                    except orjson.JSONDecodeError as e:
+                        # Only log a prefix; full responses can be several KB
+                        logger.error(
+                            "Gemini JSON parse failed: %s; resp[:500]=%r",
+                            e, cleaned_text[:500],
+                            extra={'resp_len': len(cleaned_text)}
+                        )
+                        raise GeminiResponseError("Received unparseable JSON from API")
+            else:
+                result = text
             
-            return text
+            if cache_key is not None:
+                await _response_cache.aset(cache_key, result, settings.GEMINI_CACHE_TIMEOUT)
+            if semantic_namespace is not None:
+                semantic_cache.store(semantic_namespace, cache_key, semantic_embedding, result)
+            
+            return result
             
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             error_msg = str(e)
             
             # Log detailed error for debugging (but don't expose to user)
             logger.error(f"Gemini API call failed: {error_msg}", exc_info=True)
             
             # Provide user-friendly error message
-            if "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
+            if isinstance(e, GeminiResponseError):
+                # Bad model output is not the client's fault, so never map it to a 400
+                raise Exception("AI service temporarily unavailable. Please try again later.")
+            elif "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
                 raise Exception("AI service rate limit exceeded. Please try again later.")
             elif "invalid" in error_msg.lower() or "malformed" in error_msg.lower():
                 raise ValueError("Invalid request format. Please check your input.")
             else:
                 raise Exception("AI service temporarily unavailable. Please try again later.")
     
-    def generate_clarifying_questions(
+    async def _stream_gemini_items(
+        self,
+        prompt: str,
+        response_schema: Dict,
+        item_path: str,
+        model_name: str = 'gemini-2.0-flash-exp',
+        system_instruction: Optional[str] = None,
+        max_output_tokens: Optional[int] = None,
+        parser_coro=ijson.items_coro
+    ) -> AsyncIterator[Any]:
+        """
+        Stream a structured Gemini response and yield array items as they complete.
+        
+        Chunks are fed into an incremental ijson parser, so the first items are
+        available before the last token arrives. Streamed responses bypass the
+        response cache.
+        
+        Args:
+            prompt: The prompt to send
+            response_schema: JSON schema for structured output
+            item_path: ijson prefix of the items to yield, e.g. 'questions.item'
+            model_name: Model to use
+            system_instruction: Static instruction served from a context cache
+            max_output_tokens: Upper bound on generated tokens
+            parser_coro: ijson coroutine, e.g. kvitems_coro to yield (key, value) pairs
+        """
+        await _take_rate_token()
+        genai = lazy_import_genai()
+        model = await _resolve_model(model_name or self.default_model_name, system_instruction)
+        generation_config = genai.types.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            max_output_tokens=max_output_tokens
+        )
+        
+        items = ijson.sendable_list()
+        parser = parser_coro(items, item_path, use_float=True)
+        
+        # The connection stays open for the whole stream, so hold the slot until it ends
+        async with _concurrency_limit():
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=True,
+                request_options={'timeout': settings.GEMINI_REQUEST_TIMEOUT}
+            )
+            async for chunk in response:
+                parser.send(chunk.text.encode('utf-8'))
+                for item in items:
+                    yield item
+                del items[:]
+        
+        parser.close()
+        for item in items:
+            yield item
+    
+    async def generate_clarifying_questions(
         self,
         patient_data: Dict,
-        language: str = 'en'
+        language: str = 'en',
+        max_items: int = 10
     ) -> List[str]:
-        """Generate clarifying questions based on patient data."""
+        """Generate at most max_items clarifying questions based on patient data."""
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
-        }
+        if _is_empty_patient_data(patient_data):
+            logger.info("skipped Gemini call: empty patient_data")
+            return []
         
-        target_lang = lang_map.get(language, 'English')
+        prompt = self._clarifying_questions_prompt(patient_data, language, max_items)
+        result = await self._call_gemini(
+            prompt,
+            response_schema=_CLARIFYING_QUESTIONS_SCHEMA,
+            max_output_tokens=_clarifying_questions_token_limit(max_items),
+            semantic_key=(f"{language}:{max_items}", _clinical_summary(patient_data))
+        )
+        # Defensive cap; the prompt and token limit already bound the count
+        return result.get('questions', [])[:max_items]
+    
+    async def stream_clarifying_questions(
+        self,
+        patient_data: Dict,
+        language: str = 'en',
+        max_items: int = 10
+    ) -> AsyncIterator[str]:
+        """Yield clarifying questions as soon as each one is generated."""
         
-        prompt = f"""
-        Based on the following patient information, generate 3-5 clarifying questions
-        that would help in making a more accurate diagnosis.
+        if _is_empty_patient_data(patient_data):
+            logger.info("skipped Gemini call: empty patient_data")
+            return
         
-        Patient Information:
-        - Complaints: {patient_data.get('complaints', 'Not provided')}
-        - History: {patient_data.get('history', 'Not provided')}
-        - Objective Data: {patient_data.get('objectiveData', 'Not provided')}
-        - Lab Results: {patient_data.get('labResults', 'Not provided')}
+        prompt = self._clarifying_questions_prompt(patient_data, language, max_items)
+        async for question in self._stream_gemini_items(
+            prompt,
+            _CLARIFYING_QUESTIONS_SCHEMA,
+            'questions.item',
+            max_output_tokens=_clarifying_questions_token_limit(max_items)
+        ):
+            yield question
+            max_items -= 1
+            if max_items <= 0:
+                break
+    
+    def _clarifying_questions_prompt(
+        self,
+        patient_data: Dict,
+        language: str,
+        max_items: int
+    ) -> str:
+        """Build the clarifying questions prompt."""
         
-        Return the questions in {target_lang} language as a JSON array of strings.
-        Format: {{"questions": ["Question 1?", "Question 2?", ...]}}
-        """
+        target_lang = _LANG_MAP.get(language, 'English')
         
-        schema = {
-            "type": "object",
-            "properties": {
-                "questions": {
-                    "type": "array",
-                    "items": {"type": "string"}
-                }
-            },
-            "required": ["questions"]
-        }
-        
-        result = self._call_gemini(prompt, response_schema=schema)
-        return result.get('questions', [])
+        return _CLARIFYING_QUESTIONS_TEMPLATE.format_map(
+            _patient_context(patient_data, target_lang).new_child({'max_questions': max_items})
+        )
     
-    def recommend_specialists(
+    async def recommend_specialists(
         self,
         patient_data: Dict,
         language: str = 'en'
     ) -> Dict:
         """Recommend specialists based on patient data and disease condition."""
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
-        }
-        
-        target_lang = lang_map.get(language, 'English')
-        
-        # Extract comprehensive patient information
-        complaints = patient_data.get('complaints', 'Not provided')
-        history = patient_data.get('history', 'Not provided')
-        objective_data = patient_data.get('objectiveData', 'Not provided')
-        lab_results = patient_data.get('labResults', 'Not provided')
-        additional_info = patient_data.get('additionalInfo', 'Not provided')
-        age = patient_data.get('age', 'Not provided')
-        gender = patient_data.get('gender', 'Not provided')
-        current_medications = patient_data.get('currentMedications', 'Not provided')
+        target_lang = _LANG_MAP.get(language, 'English')
         
         # Analyze the disease/symptom pattern to recommend appropriate medical specialties
-        prompt = f"""
-        You are a medical consultation coordinator. Based on the patient's condition, symptoms, and clinical data, 
-        recommend 5-6 MEDICAL SPECIALTIES (not AI models) that are MOST RELEVANT and NECESSARY for this specific case.
-        
-        IMPORTANT: The specialty selection MUST be based on the DISEASE/SYMPTOM TYPE. Different diseases require 
-        different specialist teams. DO NOT recommend a generic team - tailor it to the specific medical condition.
-        
-        CRITICAL: Recommend MEDICAL SPECIALTIES (e.g., "Cardiology", "Neurology", "Radiology", etc.), NOT AI model names.
-        The AI models will be assigned to these specialties automatically by the system.
-        
-        Patient Information:
-        - Age: {age}
-        - Gender: {gender}
-        - Chief Complaints (Symptoms): {complaints}
-        - Medical History: {history}
-        - Objective Physical Examination Data: {objective_data}
-        - Laboratory Results: {lab_results}
-        - Current Medications: {current_medications}
-        - Additional Information: {additional_info}
-        
-        Available Medical Specialties (use EXACT names):
-        - "Cardiology" (Heart and cardiovascular diseases, chest pain, hypertension, arrhythmias)
-        - "Neurology" (Brain, nerves, headaches, seizures, neurological conditions)
-        - "Radiology" (Medical imaging interpretation, X-rays, CT scans, MRIs, ultrasound)
-        - "Oncology" (Cancer, tumors, malignancies, cancer diagnosis and treatment)
-        - "Endocrinology" (Hormones, diabetes, thyroid disorders, metabolic conditions)
-        - "Gastroenterology" (Digestive system, liver, stomach, intestines)
-        - "Pulmonology" (Lungs, respiratory system, breathing disorders)
-        - "Nephrology" (Kidneys, renal diseases, dialysis)
-        - "Rheumatology" (Joints, autoimmune diseases, arthritis)
-        - "Infectious Disease" (Infections, bacterial/viral diseases, antibiotics)
-        - "Hematology" (Blood disorders, anemia, clotting problems)
-        - "Geriatrics" (Elderly care, age-related conditions)
-        - "Emergency Medicine" (Acute care, trauma, critical conditions)
-        - "Internal Medicine" (General medicine, complex multi-system diseases)
-        - "Pediatrics" (Children's health, pediatric conditions)
-        - "Dermatology" (Skin conditions, dermatological diseases)
-        - "Orthopedics" (Bones, joints, fractures, musculoskeletal)
-        - "Urology" (Urinary system, kidneys, bladder)
-        - "Gynecology" (Women's reproductive health)
-        - "Psychiatry" (Mental health, psychological conditions)
-        
-        Analysis Instructions:
-        1. Identify the PRIMARY disease/symptom category (e.g., cardiovascular, neurological, gastrointestinal, respiratory, oncological, endocrine, etc.)
-        2. Select 5-6 MEDICAL SPECIALTIES (not AI models) that directly relate to the identified condition and its complications
-        3. Consider related organ systems and potential comorbidities
-        4. Prioritize specialties based on disease relevance - the most important specialties first
-        5. For each specialty, provide a clear reason explaining why this medical specialty is needed for THIS SPECIFIC CASE and how it relates to the disease/symptoms
-        
-        Examples:
-        - For chest pain + cardiac symptoms → Recommend: Cardiology (primary), Radiology (for imaging), Emergency Medicine (if acute), etc.
-        - For headache + neurological symptoms → Recommend: Neurology (primary), Radiology (for brain imaging), Emergency Medicine (if severe), etc.
-        - For suspected cancer/tumor → Recommend: Oncology (primary), Radiology (for imaging), relevant organ specialty (e.g., Gastroenterology for GI cancer), etc.
-        - For diabetes/metabolic issues → Recommend: Endocrinology (primary), Cardiology (complications), Nephrology (kidney complications), etc.
-        
-        Return recommendations in {target_lang} with this JSON format:
-        {{
-            "recommendations": [
-                {{
-                    "specialty": "Cardiology",
-                    "reason": "Detailed explanation why this specialty is needed for this specific case"
-                }}
-            ]
-        }}
+        prompt = _RECOMMEND_SPECIALISTS_TEMPLATE.format_map(
+            _patient_context(patient_data, target_lang)
+        )
         
-        Make sure to return exactly 5-6 specialty recommendations based on disease-specific needs.
-        DO NOT include AI model names in your response - only medical specialties.
-        """
-        
-        schema = {
-            "type": "object",
-            "properties": {
-                "recommendations": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "specialty": {"type": "string"},
-                            "reason": {"type": "string"}
-                        },
-                        "required": ["specialty", "reason"]
-                    },
-                    "minItems": 5,
-                    "maxItems": 6
-                }
-            },
-            "required": ["recommendations"]
-        }
-        
-        result = self._call_gemini(prompt, response_schema=schema, model_name='gemini-2.0-flash-exp')
-        
-        # Map specialties to AI models
-        specialty_to_model = {
-            'Cardiology': 'Gemini',
-            'Neurology': 'Claude',
-            'Radiology': 'GPT',
-            'Oncology': 'Llama',
-            'Endocrinology': 'Grok',
-            # Default mappings for other specialties
-            'Gastroenterology': 'Gemini',
-            'Pulmonology': 'GPT',
-            'Nephrology': 'Gemini',
-            'Rheumatology': 'Claude',
-            'Infectious Disease': 'Llama',
-            'Hematology': 'Llama',
-            'Geriatrics': 'Gemini',
-            'Emergency Medicine': 'GPT',
-            'Internal Medicine': 'Gemini',
-            'Pediatrics': 'Claude',
-            'Dermatology': 'GPT',
-            'Orthopedics': 'GPT',
-            'Urology': 'Gemini',
-            'Gynecology': 'Gemini',
-            'Psychiatry': 'Claude',
-        }
+        result = await self._call_gemini(
+            prompt,
+            response_schema=_RECOMMEND_SPECIALISTS_SCHEMA,
+            model_name='gemini-2.0-flash-exp',
+            system_instruction=_RECOMMEND_SPECIALISTS_INSTRUCTION
+        )
         
         # Add AI model to each recommendation
         if result.get('recommendations'):
             for rec in result['recommendations']:
                 specialty_name = rec.get('specialty', '')
-                rec['model'] = specialty_to_model.get(specialty_name, 'Gemini')  # Default fallback
+                rec['model'] = _SPECIALTY_TO_MODEL.get(specialty_name, 'Gemini')  # Default fallback
         
         return result
     
-    def generate_initial_diagnoses(
+    async def generate_initial_diagnoses(
         self,
         patient_data: Dict,
         language: str = 'en'
     ) -> List[Dict]:
         """Generate initial differential diagnoses."""
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
-        }
+        if _is_empty_patient_data(patient_data):
+            logger.info("skipped Gemini call: empty patient_data")
+            return []
         
-        target_lang = lang_map.get(language, 'English')
+        prompt = self._initial_diagnoses_prompt(patient_data, language)
+        result = await self._call_gemini(
+            prompt,
+            response_schema=_INITIAL_DIAGNOSES_SCHEMA,
+            system_instruction=_INITIAL_DIAGNOSES_INSTRUCTION
+        )
+        return result.get('diagnoses', [])
+    
+    async def stream_initial_diagnoses(
+        self,
+        patient_data: Dict,
+        language: str = 'en'
+    ) -> AsyncIterator[Dict]:
+        """Yield initial differential diagnoses as soon as each one is generated."""
         
-        prompt = f"""
-        Based on the patient information, generate 3-5 differential diagnoses
-        with probability estimates and justification.
+        if _is_empty_patient_data(patient_data):
+            logger.info("skipped Gemini call: empty patient_data")
+            return
         
-        Patient Information:
-        - Name: {patient_data.get('firstName', '')} {patient_data.get('lastName', '')}
-        - Age: {patient_data.get('age', 'Not provided')}
-        - Gender: {patient_data.get('gender', 'Not provided')}
-        - Complaints: {patient_data.get('complaints', 'Not provided')}
-        - History: {patient_data.get('history', 'Not provided')}
-        - Objective Data: {patient_data.get('objectiveData', 'Not provided')}
-        - Lab Results: {patient_data.get('labResults', 'Not provided')}
+        prompt = self._initial_diagnoses_prompt(patient_data, language)
+        async for diagnosis in self._stream_gemini_items(
+            prompt,
+            _INITIAL_DIAGNOSES_SCHEMA,
+            'diagnoses.item',
+            system_instruction=_INITIAL_DIAGNOSES_INSTRUCTION
+        ):
+            yield diagnosis
+    
+    def _initial_diagnoses_prompt(self, patient_data: Dict, language: str) -> str:
+        """Build the initial diagnoses prompt."""
         
-        Return in {target_lang} with this JSON format:
-        {{
-            "diagnoses": [
-                {{
-                    "name": "Diagnosis name",
-                    "probability": 0.75,
-                    "justification": "Why this diagnosis is likely",
-                    "evidenceLevel": "High/Moderate/Low"
-                }}
-            ]
-        }}
-        """
+        target_lang = _LANG_MAP.get(language, 'English')
         
-        schema = {
-            "type": "object",
-            "properties": {
-                "diagnoses": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "probability": {"type": "number"},
-                            "justification": {"type": "string"},
-                            "evidenceLevel": {"type": "string"}
-                        },
-                        "required": ["name", "probability", "justification", "evidenceLevel"]
-                    }
-                }
-            },
-            "required": ["diagnoses"]
-        }
+        return _INITIAL_DIAGNOSES_TEMPLATE.format_map(
+            _patient_context(patient_data, target_lang)
+        )
+    
+    async def run_initial_pipeline(
+        self,
+        patient_data: Dict,
+        language: str = 'en'
+    ) -> Dict:
+        """Run the independent initial consultation calls concurrently."""
         
-        result = self._call_gemini(prompt, response_schema=schema)
-        return result.get('diagnoses', [])
+        questions, specialists, diagnoses = await asyncio.gather(
+            self.generate_clarifying_questions(patient_data, language),
+            self.recommend_specialists(patient_data, language),
+            self.generate_initial_diagnoses(patient_data, language),
+        )
+        
+        return {
+            'questions': questions,
+            'recommendations': specialists.get('recommendations', []),
+            'diagnoses': diagnoses,
+        }
     
-    def generate_final_report(
+    async def generate_final_report(
         self,
         patient_data: Dict,
         debate_history: List[Dict],
@@ -370,219 +1110,206 @@ class GeminiService:
     ) -> Dict:
         """Generate final medical report."""
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
-        }
+        prompt = self._final_report_prompt(patient_data, debate_history, diagnoses, language)
+        result = await self._call_gemini(prompt, response_schema=_FINAL_REPORT_SCHEMA)
+        return result
+    
+    async def stream_final_report(
+        self,
+        patient_data: Dict,
+        debate_history: List[Dict],
+        diagnoses: List[Dict],
+        language: str = 'en'
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield (section, value) pairs of the final report as each section is complete."""
         
-        target_lang = lang_map.get(language, 'English')
+        prompt = self._final_report_prompt(patient_data, debate_history, diagnoses, language)
+        async for section in self._stream_gemini_items(
+            prompt,
+            _FINAL_REPORT_SCHEMA,
+            '',
+            parser_coro=ijson.kvitems_coro
+        ):
+            yield section
+    
+    def _final_report_prompt(
+        self,
+        patient_data: Dict,
+        debate_history: List[Dict],
+        diagnoses: List[Dict],
+        language: str
+    ) -> str:
+        """Build the final report prompt."""
+        
+        target_lang = _LANG_MAP.get(language, 'English')
         
         # Prepare debate summary
         debate_summary = "\n".join([
-            f"{msg.get('author', 'Unknown')}: {msg.get('content', '')[:200]}..."
+            "%s: %s..." % (msg.get('author', 'Unknown'), (msg.get('content') or '')[:200])
             for msg in debate_history[-10:]  # Last 10 messages
         ])
         
-        prompt = f"""
-        Generate a comprehensive medical report based on the AI council discussion.
-        
-        Patient: {patient_data.get('firstName', '')} {patient_data.get('lastName', '')}
-        Age: {patient_data.get('age', '')}, Gender: {patient_data.get('gender', '')}
-        
-        Chief Complaints: {patient_data.get('complaints', '')}
-        
-        Differential Diagnoses Considered:
-        {json.dumps(diagnoses, indent=2)}
-        
-        Debate Summary:
-        {debate_summary}
-        
-        Generate a complete report in {target_lang} with:
-        - Consensus diagnosis (most likely diagnoses with probability)
-        - Rejected hypotheses and why
-        - Recommended tests
-        - Treatment plan
-        - Medication recommendations
-        - Follow-up plan
-        - Prognosis
-        - Any unexpected findings
+        return _FINAL_REPORT_TEMPLATE.format(
+            firstName=patient_data.get('firstName', ''),
+            lastName=patient_data.get('lastName', ''),
+            age=patient_data.get('age', ''),
+            gender=patient_data.get('gender', ''),
+            complaints=patient_data.get('complaints', ''),
+            diagnoses=orjson.dumps(diagnoses, option=orjson.OPT_INDENT_2).decode(),
+            debate_summary=debate_summary,
+            target_lang=target_lang
+        )
+    
+    async def check_drug_interactions(
+        self,
+        medications: List[str],
+        language: str = 'en',
+        batch_key: Any = None
+    ) -> List[Dict]:
+        """
+        Check for drug interactions.
         
-        Return as structured JSON.
+        Concurrent checks sharing a batch_key (the requesting user) are coalesced
+        into one prompt. Without a key the set is checked on its own, so one
+        user's free-text input never shares a prompt with another's.
         """
         
-        schema = {
-            "type": "object",
-            "properties": {
-                "consensusDiagnosis": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "probability": {"type": "number"},
-                            "justification": {"type": "string"},
-                            "evidenceLevel": {"type": "string"}
-                        }
-                    }
-                },
-                "rejectedHypotheses": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "reason": {"type": "string"}
-                        }
-                    }
-                },
-                "recommendedTests": {
-                    "type": "array",
-                    "items": {"type": "string"}
-                },
-                "treatmentPlan": {
-                    "type": "array",
-                    "items": {"type": "string"}
-                },
-                "medicationRecommendations": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "dosage": {"type": "string"},
-                            "notes": {"type": "string"}
-                        }
-                    }
-                },
-                "unexpectedFindings": {"type": "string"}
-            }
-        }
+        if batch_key is None:
+            results = await self.check_drug_interactions_batch([medications], language)
+            return results[0]
+        # Send this request's cache-event list along, since the batch runs in another task
+        return await self._interaction_batcher.submit(
+            (medications, _cache_events.get()), key=(batch_key, language)
+        )
+    
+    async def _check_interaction_batch(self, key: tuple, payloads: List[tuple]) -> List[List[Dict]]:
+        """Batcher handler: check the sets and credit cache outcomes to every submitter."""
         
-        result = self._call_gemini(prompt, response_schema=schema)
-        return result
+        # The dispatch task inherited the first submitter's context; record into a fresh list
+        batch_events = track_cache_events()
+        results = await self.check_drug_interactions_batch(
+            [medications for medications, _ in payloads], key[1]
+        )
+        for _, events in payloads:
+            if events is not None:
+                events.extend(batch_events)
+        return results
     
-    def check_drug_interactions(
+    async def check_drug_interactions_batch(
         self,
-        medications: List[str],
+        medication_sets: List[List[str]],
         language: str = 'en'
-    ) -> List[Dict]:
-        """Check for drug interactions."""
+    ) -> List[List[Dict]]:
+        """
+        Check drug interactions for several medication sets in one call.
+        
+        Results are cached per canonical set, so a set is answered from cache
+        whichever batch it was first checked in, and duplicate sets within a
+        batch are only sent to the model once.
+        """
+        
+        target_lang = _LANG_MAP.get(language, 'English')
+        
+        if not medication_sets:
+            return []
+        
+        # Interactions are commutative, so canonicalize each set before prompting
+        canonical_sets = [tuple(_canonical_medications(medications)) for medications in medication_sets]
+        unique_sets = list(dict.fromkeys(canonical_sets))
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
+        cache_keys = {
+            canonical: _interaction_cache_key(canonical, language)
+            for canonical in unique_sets if canonical
         }
+        cached = await _response_cache.aget_many(list(cache_keys.values()))
+        interactions_by_canonical = {(): []}
+        for canonical, key in cache_keys.items():
+            if key in cached:
+                interactions_by_canonical[canonical] = cached[key]
+        missing = [canonical for canonical in unique_sets if canonical not in interactions_by_canonical]
+        self.cache_stats['hits'] += len(cache_keys) - len(missing)
         
-        target_lang = lang_map.get(language, 'English')
+        if not missing:
+            _record_cache_event(True)
+            return [interactions_by_canonical[canonical] for canonical in canonical_sets]
         
-        medications_str = ", ".join(medications)
+        sets_str = "\n".join(
+            f"{index}) {', '.join(canonical)}"
+            for index, canonical in enumerate(missing, start=1)
+        )
         
-        prompt = f"""
-        Check for potential drug interactions between these medications:
-        {medications_str}
+        prompt = _DRUG_INTERACTIONS_TEMPLATE.format(sets=sets_str, target_lang=target_lang)
         
-        Return interactions in {target_lang} with JSON format:
-        {{
-            "interactions": [
-                {{
-                    "interaction": "Drug A + Drug B",
-                    "severity": "High/Medium/Low",
-                    "mechanism": "How they interact",
-                    "management": "What to do"
-                }}
-            ]
-        }}
-        """
+        # The whole-batch prompt is never repeated, so cache per set instead
+        self.cache_stats['misses'] += 1
+        result = await self._call_gemini(
+            prompt,
+            response_schema=_DRUG_INTERACTIONS_SCHEMA,
+            use_cache=False
+        )
         
-        schema = {
-            "type": "object",
-            "properties": {
-                "interactions": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "interaction": {"type": "string"},
-                            "severity": {"type": "string"},
-                            "mechanism": {"type": "string"},
-                            "management": {"type": "string"}
-                        }
-                    }
-                }
-            }
-        }
+        # Map results back to the missing sets (model indexes are 1-based)
+        fetched = [[] for _ in missing]
+        for item in result.get('results', []):
+            if not isinstance(item, dict):
+                continue
+            index = item.get('index')
+            if isinstance(index, int) and 1 <= index <= len(missing):
+                fetched[index - 1] = item.get('interactions') or []
+        
+        await _response_cache.aset_many(
+            {cache_keys[canonical]: interactions for canonical, interactions in zip(missing, fetched)},
+            settings.GEMINI_CACHE_TIMEOUT
+        )
+        interactions_by_canonical.update(zip(missing, fetched))
         
-        result = self._call_gemini(prompt, response_schema=schema)
-        return result.get('interactions', [])
+        return [interactions_by_canonical[canonical] for canonical in canonical_sets]
     
-    def suggest_cme_topics(
+    async def suggest_cme_topics(
         self,
         analyses: List[Dict],
         language: str = 'en'
     ) -> List[Dict]:
         """Suggest CME topics based on user's case history."""
         
-        lang_map = {
-            'uz-L': 'Uzbek (Latin script)',
-            'uz-C': 'Uzbek (Cyrillic script)',
-            'ru': 'Russian',
-            'en': 'English'
-        }
+        target_lang = _LANG_MAP.get(language, 'English')
         
-        target_lang = lang_map.get(language, 'English')
-        
-        # Extract diagnoses from analyses
-        diagnoses = []
+        # Collect up to 20 unique diagnosis names in a single pass
+        names = set()
         for analysis in analyses[:10]:  # Last 10 analyses
-            if isinstance(analysis, dict) and 'final_report' in analysis:
-                report = analysis['final_report']
-                if isinstance(report, dict) and 'consensusDiagnosis' in report:
-                    for dx in report['consensusDiagnosis']:
-                        if isinstance(dx, dict):
-                            diagnoses.append(dx.get('name', ''))
-        
-        diagnoses_str = ", ".join(set(diagnoses[:20]))
+            report = analysis.get('final_report') if isinstance(analysis, dict) else None
+            if not isinstance(report, dict):
+                continue
+            for dx in report.get('consensusDiagnosis') or []:
+                name = dx.get('name') if isinstance(dx, dict) else None
+                if name:
+                    names.add(name)
+                    if len(names) >= 20:
+                        break
+            if len(names) >= 20:
+                break
         
-        prompt = f"""
-        Based on these recent cases: {diagnoses_str}
-        
-        Suggest 3-5 CME (Continuing Medical Education) topics that would be
-        most relevant for this physician in {target_lang}.
-        
-        Return as JSON:
-        {{
-            "topics": [
-                {{
-                    "topic": "Topic name",
-                    "relevance": "Why this is relevant"
-                }}
-            ]
-        }}
-        """
+        # Sorted so the same case history always yields the same prompt
+        diagnoses_str = ", ".join(sorted(names))
         
-        schema = {
-            "type": "object",
-            "properties": {
-                "topics": {
-                    "type": "array",
-                    "items": {
-                        "type": "object",
-                        "properties": {
-                            "topic": {"type": "string"},
-                            "relevance": {"type": "string"}
-                        }
-                    }
-                }
-            }
-        }
+        prompt = _CME_TOPICS_TEMPLATE.format(diagnoses=diagnoses_str, target_lang=target_lang)
         
-        result = self._call_gemini(prompt, response_schema=schema)
+        result = await self._call_gemini(
+            prompt,
+            response_schema=_CME_TOPICS_SCHEMA,
+            semantic_key=(language, diagnoses_str)
+        )
         return result.get('topics', [])
 
 
-# Singleton instance (safe: no heavy imports in __init__)
-gemini_service = GeminiService()
+# Singleton instance, created on first access (PEP 562) rather than at import
+_instance: Optional[GeminiService] = None
+
+
+def __getattr__(name):
+    global _instance
+    if name == 'gemini_service':
+        if _instance is None:
+            _instance = GeminiService()
+        return _instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
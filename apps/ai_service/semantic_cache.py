@@ -0,0 +1,108 @@
+"""
+In-process semantic cache for near-duplicate Gemini prompts.
+
+Exact hashing misses prompts that differ only in wording ("55yo male chest pain, HTN"
+vs "55yo M chest pain, hypertension"). This cache embeds prompts with a small local
+sentence-transformers model and returns a stored response when a previous prompt for
+the same endpoint is similar enough.
+
+It is disabled unless GEMINI_SEMANTIC_CACHE_ENABLED is set, and requires the optional
+sentence-transformers package. Callers opt in per endpoint and pass only the
+request-specific text (not the templated prompt), since shared boilerplate would
+inflate similarity. Endpoints whose answers depend on exact clinical details
+(diagnoses, drug interactions, reports) must not use it.
+"""
+import collections
+import copy
+import functools
+import logging
+import threading
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoder():
+    """Load the embedding model lazily; return None if it is not installed."""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("sentence-transformers is not installed; semantic cache disabled")
+        return None
+    return SentenceTransformer(settings.GEMINI_SEMANTIC_CACHE_MODEL)
+
+
+class SemanticCache:
+    """
+    LRU of (embedding, response) pairs, bucketed by namespace.
+
+    A namespace identifies one endpoint (model + schema + system instruction), so
+    prompts are only ever compared with prompts of the same kind.
+    """
+
+    def __init__(self, max_entries: int = 500, threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        # Only the setting: loading the encoder is slow and must stay off the event loop
+        return settings.GEMINI_SEMANTIC_CACHE_ENABLED
+
+    def embed(self, prompt: str):
+        """Return the normalized embedding of a prompt."""
+        return _get_encoder().encode(prompt, normalize_embeddings=True)
+
+    def lookup(self, namespace: str, prompt: str) -> Tuple[Optional[Any], Any]:
+        """
+        Find the most similar cached prompt in the namespace.
+
+        Blocking (it may load the encoder), so call it from a worker thread.
+
+        Returns:
+            (cached response or None, prompt embedding for a later store(),
+            or None when the encoder is unavailable)
+        """
+        import numpy as np
+
+        if _get_encoder() is None:
+            return None, None
+        embedding = self.embed(prompt)
+        with self._lock:
+            bucket = self._buckets.get(namespace)
+            if not bucket:
+                return None, embedding
+
+            keys = list(bucket.keys())
+            # Embeddings are normalized, so one matmul yields all cosine similarities
+            matrix = np.stack([bucket[key][0] for key in keys])
+            scores = matrix @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None, embedding
+
+            bucket.move_to_end(keys[best])
+            return copy.deepcopy(bucket[keys[best]][1]), embedding
+
+    def store(self, namespace: str, prompt_key: str, embedding, value: Any) -> None:
+        """Insert a response, evicting the least recently used entry when full."""
+        if embedding is None:
+            return
+        with self._lock:
+            bucket = self._buckets.setdefault(namespace, collections.OrderedDict())
+            bucket[prompt_key] = (embedding, copy.deepcopy(value))
+            bucket.move_to_end(prompt_key)
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+
+
+semantic_cache = SemanticCache(
+    max_entries=settings.GEMINI_SEMANTIC_CACHE_SIZE,
+    threshold=settings.GEMINI_SEMANTIC_CACHE_THRESHOLD
+)
@@ -1,17 +1,24 @@
 from rest_framework import serializers
 
 
-class ClarifyingQuestionsRequestSerializer(serializers.Serializer):
-    """Serializer for clarifying questions request."""
-    patient_data = serializers.JSONField()
+class LanguageRequestBase(serializers.Serializer):
+    """Base serializer for requests carrying a response language."""
+    _LANGS = ('en', 'uz-L', 'uz-C', 'ru')
+    _VALID_LANGS = frozenset(_LANGS)
+    _INVALID_LANG_MESSAGE = 'Invalid language. Must be one of: ' + ', '.join(_LANGS)
+    
     language = serializers.CharField(default='en', max_length=10)
     
     def validate_language(self, value):
         """Validate language parameter."""
-        valid_languages = ['en', 'uz-L', 'uz-C', 'ru']
-        if value not in valid_languages:
-            raise serializers.ValidationError(f'Invalid language. Must be one of: {", ".join(valid_languages)}')
+        if value not in self._VALID_LANGS:
+            raise serializers.ValidationError(self._INVALID_LANG_MESSAGE)
         return value
+
+
+class PatientRequestBase(LanguageRequestBase):
+    """Base serializer for requests carrying patient data and a language."""
+    patient_data = serializers.JSONField()
     
     def validate_patient_data(self, value):
         """Validate patient data structure."""
@@ -20,28 +27,18 @@ class ClarifyingQuestionsRequestSerializer(serializers.Serializer):
         return value
 
 
+class ClarifyingQuestionsRequestSerializer(PatientRequestBase):
+    """Serializer for clarifying questions request."""
+    max_questions = serializers.IntegerField(default=10, min_value=1, max_value=10)
+
+
 class ClarifyingQuestionsResponseSerializer(serializers.Serializer):
     """Serializer for clarifying questions response."""
     questions = serializers.ListField(child=serializers.CharField())
 
 
-class SpecialistRecommendationRequestSerializer(serializers.Serializer):
+class SpecialistRecommendationRequestSerializer(PatientRequestBase):
     """Serializer for specialist recommendation request."""
-    patient_data = serializers.JSONField()
-    language = serializers.CharField(default='en', max_length=10)
-    
-    def validate_language(self, value):
-        """Validate language parameter."""
-        valid_languages = ['en', 'uz-L', 'uz-C', 'ru']
-        if value not in valid_languages:
-            raise serializers.ValidationError(f'Invalid language. Must be one of: {", ".join(valid_languages)}')
-        return value
-    
-    def validate_patient_data(self, value):
-        """Validate patient data structure."""
-        if not isinstance(value, dict):
-            raise serializers.ValidationError('Patient data must be a dictionary.')
-        return value
 
 
 class SpecialistRecommendationSerializer(serializers.Serializer):
@@ -64,17 +61,8 @@ class DiagnosisSerializer(serializers.Serializer):
     evidenceLevel = serializers.CharField()
 
 
-class InitialDiagnosesRequestSerializer(serializers.Serializer):
+class InitialDiagnosesRequestSerializer(PatientRequestBase):
     """Serializer for initial diagnoses request."""
-    patient_data = serializers.JSONField()
-    language = serializers.CharField(default='en', max_length=10)
-    
-    def validate_language(self, value):
-        """Validate language parameter."""
-        valid_languages = ['en', 'uz-L', 'uz-C', 'ru']
-        if value not in valid_languages:
-            raise serializers.ValidationError(f'Invalid language. Must be one of: {", ".join(valid_languages)}')
-        return value
 
 
 class InitialDiagnosesResponseSerializer(serializers.Serializer):
@@ -82,12 +70,21 @@ class InitialDiagnosesResponseSerializer(serializers.Serializer):
     diagnoses = DiagnosisSerializer(many=True)
 
 
-class FinalReportRequestSerializer(serializers.Serializer):
+class InitialPipelineRequestSerializer(PatientRequestBase):
+    """Serializer for initial consultation pipeline request."""
+
+
+class InitialPipelineResponseSerializer(serializers.Serializer):
+    """Serializer for initial consultation pipeline response."""
+    questions = serializers.ListField(child=serializers.CharField())
+    recommendations = SpecialistRecommendationSerializer(many=True)
+    diagnoses = DiagnosisSerializer(many=True)
+
+
+class FinalReportRequestSerializer(PatientRequestBase):
     """Serializer for final report request."""
-    patient_data = serializers.JSONField()
     debate_history = serializers.ListField(child=serializers.JSONField())
     diagnoses = serializers.ListField(child=serializers.JSONField())
-    language = serializers.CharField(default='en')
 
 
 class MedicationRecommendationSerializer(serializers.Serializer):
@@ -113,10 +110,9 @@ class FinalReportSerializer(serializers.Serializer):
     unexpectedFindings = serializers.CharField()
 
 
-class DrugInteractionRequestSerializer(serializers.Serializer):
+class DrugInteractionRequestSerializer(LanguageRequestBase):
     """Serializer for drug interaction request."""
     medications = serializers.ListField(child=serializers.CharField())
-    language = serializers.CharField(default='en')
 
 
 class DrugInteractionSerializer(serializers.Serializer):
@@ -132,10 +128,29 @@ class DrugInteractionResponseSerializer(serializers.Serializer):
     interactions = DrugInteractionSerializer(many=True)
 
 
-class CMETopicRequestSerializer(serializers.Serializer):
+class DrugInteractionBatchRequestSerializer(LanguageRequestBase):
+    """Serializer for batched drug interaction request."""
+    medication_sets = serializers.ListField(
+        child=serializers.ListField(child=serializers.CharField(), min_length=1),
+        min_length=1,
+        max_length=20
+    )
+
+
+class DrugInteractionBatchResultSerializer(serializers.Serializer):
+    """Serializer for the interactions of one medication set."""
+    index = serializers.IntegerField(help_text='0-based position of the set in medication_sets')
+    interactions = DrugInteractionSerializer(many=True)
+
+
+class DrugInteractionBatchResponseSerializer(serializers.Serializer):
+    """Serializer for batched drug interaction response."""
+    results = DrugInteractionBatchResultSerializer(many=True)
+
+
+class CMETopicRequestSerializer(LanguageRequestBase):
     """Serializer for CME topic request."""
     analyses = serializers.ListField(child=serializers.JSONField())
-    language = serializers.CharField(default='en')
 
 
 class CMETopicSerializer(serializers.Serializer):
@@ -0,0 +1,142 @@
+"""
+Tests for AI service batching.
+"""
+import asyncio
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from .batcher import AsyncBatcher
+from .gemini_service import GeminiService, track_cache_events
+
+
+class AsyncBatcherTests(SimpleTestCase):
+    """Coalescing behaviour of AsyncBatcher."""
+
+    def make_batcher(self, **kwargs):
+        calls = []
+
+        async def handler(key, payloads):
+            calls.append((key, list(payloads)))
+            await asyncio.sleep(0)
+            return [f"{key}:{payload}" for payload in payloads]
+
+        return AsyncBatcher(handler, **kwargs), calls
+
+    async def test_coalesces_concurrent_submissions(self):
+        batcher, calls = self.make_batcher(max_batch_size=8, window=0)
+        results = await asyncio.gather(*[batcher.submit(i, key='a') for i in range(5)])
+        self.assertEqual(results, [f"a:{i}" for i in range(5)])
+        self.assertEqual(calls, [('a', [0, 1, 2, 3, 4])])
+
+    async def test_keys_are_never_mixed(self):
+        batcher, calls = self.make_batcher(window=0)
+        results = await asyncio.gather(
+            batcher.submit(1, key='user-1'),
+            batcher.submit(2, key='user-2'),
+            batcher.submit(3, key='user-1'),
+        )
+        self.assertEqual(results, ['user-1:1', 'user-2:2', 'user-1:3'])
+        self.assertCountEqual(calls, [('user-1', [1, 3]), ('user-2', [2])])
+
+    async def test_respects_max_batch_size(self):
+        batcher, calls = self.make_batcher(max_batch_size=2, window=0)
+        await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+        self.assertEqual([len(payloads) for _, payloads in calls], [2, 2, 1])
+
+    async def test_window_collects_late_submissions(self):
+        batcher, calls = self.make_batcher(window=0.05)
+
+        async def late():
+            await asyncio.sleep(0.01)
+            return await batcher.submit('late')
+
+        await asyncio.gather(batcher.submit('early'), late())
+        self.assertEqual(calls, [(None, ['early', 'late'])])
+
+    async def test_handler_error_reaches_every_caller(self):
+        async def handler(key, payloads):
+            raise RuntimeError('boom')
+
+        batcher = AsyncBatcher(handler, window=0)
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    async def test_short_result_list_is_an_error(self):
+        async def handler(key, payloads):
+            return payloads[:1]
+
+        batcher = AsyncBatcher(handler, window=0)
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_state_is_per_event_loop(self):
+        batcher, calls = self.make_batcher(window=0)
+        # Each asyncio.run() is a fresh loop, as with async views under WSGI
+        self.assertEqual(asyncio.run(batcher.submit(1)), 'None:1')
+        self.assertEqual(asyncio.run(batcher.submit(2)), 'None:2')
+        self.assertEqual(len(calls), 2)
+
+
+class DrugInteractionBatchTests(SimpleTestCase):
+    """Per-set caching and deduplication of batched interaction checks."""
+
+    def setUp(self):
+        cache.clear()
+        self.service = GeminiService()
+        self.prompts = []
+
+        async def fake_call_gemini(prompt, **kwargs):
+            self.prompts.append(prompt)
+            lines = [line for line in prompt.splitlines() if line[:1].isdigit() and ') ' in line]
+            return {
+                'results': [
+                    {'index': int(line.split(')')[0]), 'interactions': [{'interaction': line.split(') ', 1)[1]}]}
+                    for line in lines
+                ]
+            }
+
+        patcher = mock.patch.object(self.service, '_call_gemini', side_effect=fake_call_gemini)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_duplicate_sets_are_prompted_once(self):
+        results = await self.service.check_drug_interactions_batch([['a', 'b'], ['c', 'd'], ['B', 'a']])
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual(self.prompts[0].count('a, b'), 1)
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[1], [{'interaction': 'c, d'}])
+
+    async def test_sets_are_cached_individually(self):
+        await self.service.check_drug_interactions_batch([['a', 'b'], ['c', 'd']])
+        results = await self.service.check_drug_interactions(['d', 'c'])
+        self.assertEqual(len(self.prompts), 1)
+        self.assertEqual(results, [{'interaction': 'c, d'}])
+
+    async def test_only_uncached_sets_are_prompted(self):
+        await self.service.check_drug_interactions(['a', 'b'])
+        await self.service.check_drug_interactions_batch([['a', 'b'], ['e', 'f']])
+        self.assertEqual(len(self.prompts), 2)
+        self.assertNotIn('a, b', self.prompts[1])
+
+    async def test_different_users_do_not_share_a_prompt(self):
+        await asyncio.gather(
+            self.service.check_drug_interactions(['a'], batch_key=1),
+            self.service.check_drug_interactions(['b'], batch_key=2),
+        )
+        self.assertEqual(len(self.prompts), 2)
+
+    async def test_cache_events_reach_every_submitter(self):
+        await self.service.check_drug_interactions_batch([['a'], ['b']])
+
+        async def request(medications):
+            events = track_cache_events()
+            await self.service.check_drug_interactions(medications, batch_key=1)
+            return events
+
+        self.assertEqual(await asyncio.gather(request(['a']), request(['b'])), [[True], [True]])
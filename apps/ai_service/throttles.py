@@ -1,6 +1,7 @@
 """
 Custom throttling classes for AI service endpoints.
 """
+from django.core.cache import caches
 from rest_framework.throttling import UserRateThrottle
 
 
@@ -10,12 +11,17 @@ class AIServiceThrottle(UserRateThrottle):
     More restrictive than general user throttling to prevent abuse.
     """
     scope = 'ai_service'
+    cache = caches['default']
     
     def allow_request(self, request, view):
         """
         Implement the throttling logic.
         """
-        if request.user and request.user.is_staff:
-            # Allow staff users to bypass throttling
+        user = request.user
+        if not (user and user.is_authenticated):
+            return super().allow_request(request, view)
+        
+        if user.is_staff:
+            # Allow staff users to bypass throttling before any cache lookup
             return True
         return super().allow_request(request, view)
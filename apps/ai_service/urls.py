@@ -5,9 +5,14 @@ app_name = 'ai_service'
 
 urlpatterns = [
     path('clarifying-questions/', views.generate_clarifying_questions, name='clarifying-questions'),
+    path('clarifying-questions/stream/', views.stream_clarifying_questions, name='clarifying-questions-stream'),
     path('recommend-specialists/', views.recommend_specialists, name='recommend-specialists'),
     path('initial-diagnoses/', views.generate_initial_diagnoses, name='initial-diagnoses'),
+    path('initial-diagnoses/stream/', views.stream_initial_diagnoses, name='initial-diagnoses-stream'),
+    path('initial-pipeline/', views.initial_pipeline, name='initial-pipeline'),
     path('final-report/', views.generate_final_report, name='final-report'),
+    path('final-report/stream/', views.stream_final_report, name='final-report-stream'),
     path('drug-interactions/', views.check_drug_interactions, name='drug-interactions'),
+    path('drug-interactions-batch/', views.check_drug_interactions_batch, name='drug-interactions-batch'),
     path('cme-topics/', views.suggest_cme_topics, name='cme-topics'),
 ]
@@ -1,11 +1,18 @@
-from rest_framework.decorators import api_view, permission_classes, throttle_classes
+import functools
+import logging
+
+import orjson
+from adrf.decorators import api_view
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .gemini_service import gemini_service
+# Import the module, not the singleton, so the service is built on first use
+from . import gemini_service as gemini
 from .throttles import AIServiceThrottle
 from .serializers import (
     ClarifyingQuestionsRequestSerializer,
@@ -14,15 +21,108 @@ from .serializers import (
     SpecialistRecommendationResponseSerializer,
     InitialDiagnosesRequestSerializer,
     InitialDiagnosesResponseSerializer,
+    InitialPipelineRequestSerializer,
+    InitialPipelineResponseSerializer,
     FinalReportRequestSerializer,
     FinalReportSerializer,
     DrugInteractionRequestSerializer,
     DrugInteractionResponseSerializer,
+    DrugInteractionBatchRequestSerializer,
+    DrugInteractionBatchResponseSerializer,
     CMETopicRequestSerializer,
     CMETopicResponseSerializer,
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+def cache_status_header(view_func):
+    """
+    Add an X-Cache header: HIT when every Gemini call was served from cache, MISS otherwise.
+    """
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        events = gemini.track_cache_events()
+        response = await view_func(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['X-Cache'] = 'HIT' if events and all(events) else 'MISS'
+        return response
+    return wrapper
+
+
+_CAPACITY_ERROR = 'AI service is at capacity. Please try again shortly.'
+
+
+def _capacity_exceeded(e):
+    """503 response telling the client when the Gemini budget frees up."""
+    response = Response({'error': _CAPACITY_ERROR}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def ai_error_handler(view_func=None, *, error_message='Service temporarily unavailable. Please try again later.'):
+    """
+    Map errors raised by an AI view to responses: 503 when the Gemini budget is
+    spent, 400 for invalid input (ValueError) and 500 with error_message otherwise.
+    """
+    if view_func is None:
+        return functools.partial(ai_error_handler, error_message=error_message)
+    
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view_func(request, *args, **kwargs)
+        except gemini.GeminiCapacityError as e:
+            return _capacity_exceeded(e)
+        except ValueError as e:
+            logger.warning(f"Validation error in {view_func.__name__}: {str(e)}")
+            return Response(
+                {'error': 'Invalid input data. Please check your request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"Error in {view_func.__name__}: {str(e)}", exc_info=True)
+            return Response(
+                {'error': error_message},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    return wrapper
+
+
+async def _ndjson_stream(items):
+    """Encode an async iterator of items as newline-delimited JSON."""
+    try:
+        async for item in items:
+            yield orjson.dumps(item) + b'\n'
+    except gemini.GeminiCapacityError as e:
+        yield orjson.dumps({'error': _CAPACITY_ERROR, 'retry_after': e.retry_after}) + b'\n'
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        logger.error(f"Error streaming AI response: {str(e)}", exc_info=True)
+        yield orjson.dumps({'error': 'Service temporarily unavailable. Please try again later.'}) + b'\n'
+
+
+def _sse_event(event, data):
+    """Encode one server-sent event with a JSON payload."""
+    return b'event: ' + event + b'\ndata: ' + orjson.dumps(data) + b'\n\n'
+
+
+async def _sse_stream(sections):
+    """Encode an async iterator of (key, value) report sections as server-sent events."""
+    try:
+        async for key, value in sections:
+            yield _sse_event(b'section', {'key': key, 'value': value})
+    except gemini.GeminiCapacityError as e:
+        yield _sse_event(b'error', {'error': _CAPACITY_ERROR, 'retry_after': e.retry_after})
+        return
+    except Exception as e:
+        logger.error(f"Error streaming AI response: {str(e)}", exc_info=True)
+        yield _sse_event(b'error', {'error': 'Service temporarily unavailable. Please try again later.'})
+        return
+    yield _sse_event(b'done', {})
+
+
 @swagger_auto_schema(
     method='post',
     request_body=ClarifyingQuestionsRequestSerializer,
@@ -31,59 +131,66 @@ from .serializers import (
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def generate_clarifying_questions(request):
+@cache_status_header
+@ai_error_handler(error_message='Failed to generate clarifying questions. Please try again later.')
+async def generate_clarifying_questions(request):
     """
     Generate clarifying questions based on patient data.
-    Includes comprehensive error handling and input validation.
+    Includes input validation; errors are mapped by ai_error_handler.
     """
-    import logging
-    logger = logging.getLogger(__name__)
+    serializer = ClarifyingQuestionsRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Language and patient data shape are already checked by the serializer
+    patient_data = serializer.validated_data['patient_data']
+    language = serializer.validated_data.get('language', 'en')
+    max_questions = serializer.validated_data['max_questions']
     
+    questions = await gemini.gemini_service.generate_clarifying_questions(
+        patient_data=patient_data,
+        language=language,
+        max_items=max_questions
+    )
+    
+    # Validate response
+    if not isinstance(questions, list):
+        logger.warning(f"Unexpected response format from Gemini service: {type(questions)}")
+        questions = []
+    
+    return Response({'questions': questions})
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=ClarifyingQuestionsRequestSerializer,
+    responses={200: 'Newline-delimited JSON stream of questions'}
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AIServiceThrottle])
+async def stream_clarifying_questions(request):
+    """
+    Stream clarifying questions as newline-delimited JSON while they are generated.
+    """
     serializer = ClarifyingQuestionsRequestSerializer(data=request.data)
     
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        patient_data = serializer.validated_data['patient_data']
-        language = serializer.validated_data.get('language', 'en')
-        
-        # Validate language parameter
-        valid_languages = ['en', 'uz-L', 'uz-C', 'ru']
-        if language not in valid_languages:
-            language = 'en'
-        
-        # Validate patient data structure (basic checks)
-        if not isinstance(patient_data, dict):
-            return Response(
-                {'error': 'Invalid patient data format'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        questions = gemini_service.generate_clarifying_questions(
-            patient_data=patient_data,
-            language=language
-        )
-        
-        # Validate response
-        if not isinstance(questions, list):
-            logger.warning(f"Unexpected response format from Gemini service: {type(questions)}")
-            questions = []
-        
-        return Response({'questions': questions[:10]})  # Limit to 10 questions max
-    
-    except ValueError as e:
-        logger.warning(f"Validation error in generate_clarifying_questions: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        logger.error(f"Error generating clarifying questions: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Failed to generate clarifying questions. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    max_questions = serializer.validated_data['max_questions']
+    
+    questions = gemini.gemini_service.stream_clarifying_questions(
+        patient_data=serializer.validated_data['patient_data'],
+        language=serializer.validated_data.get('language', 'en'),
+        max_items=max_questions
+    )
+    
+    return StreamingHttpResponse(
+        _ndjson_stream(questions),
+        content_type='application/x-ndjson'
+    )
 
 
 @swagger_auto_schema(
@@ -94,7 +201,9 @@ def generate_clarifying_questions(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def recommend_specialists(request):
+@cache_status_header
+@ai_error_handler
+async def recommend_specialists(request):
     """
     Recommend specialists based on patient data.
     """
@@ -103,33 +212,15 @@ def recommend_specialists(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        patient_data = serializer.validated_data['patient_data']
-        language = serializer.validated_data.get('language', 'en')
-        
-        recommendations = gemini_service.recommend_specialists(
-            patient_data=patient_data,
-            language=language
-        )
-        
-        return Response(recommendations)
-    
-    except ValueError as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Validation error: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error in AI service: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Service temporarily unavailable. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    patient_data = serializer.validated_data['patient_data']
+    language = serializer.validated_data.get('language', 'en')
+    
+    recommendations = await gemini.gemini_service.recommend_specialists(
+        patient_data=patient_data,
+        language=language
+    )
+    
+    return Response(recommendations)
 
 
 @swagger_auto_schema(
@@ -140,7 +231,9 @@ def recommend_specialists(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def generate_initial_diagnoses(request):
+@cache_status_header
+@ai_error_handler
+async def generate_initial_diagnoses(request):
     """
     Generate initial differential diagnoses.
     """
@@ -149,33 +242,74 @@ def generate_initial_diagnoses(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        patient_data = serializer.validated_data['patient_data']
-        language = serializer.validated_data.get('language', 'en')
-        
-        diagnoses = gemini_service.generate_initial_diagnoses(
-            patient_data=patient_data,
-            language=language
-        )
-        
-        return Response({'diagnoses': diagnoses})
-    
-    except ValueError as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Validation error: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error in AI service: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Service temporarily unavailable. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    patient_data = serializer.validated_data['patient_data']
+    language = serializer.validated_data.get('language', 'en')
+    
+    diagnoses = await gemini.gemini_service.generate_initial_diagnoses(
+        patient_data=patient_data,
+        language=language
+    )
+    
+    return Response({'diagnoses': diagnoses})
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=InitialDiagnosesRequestSerializer,
+    responses={200: 'Newline-delimited JSON stream of diagnoses'}
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AIServiceThrottle])
+async def stream_initial_diagnoses(request):
+    """
+    Stream initial differential diagnoses as newline-delimited JSON while they are generated.
+    """
+    serializer = InitialDiagnosesRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    diagnoses = gemini.gemini_service.stream_initial_diagnoses(
+        patient_data=serializer.validated_data['patient_data'],
+        language=serializer.validated_data.get('language', 'en')
+    )
+    
+    return StreamingHttpResponse(
+        _ndjson_stream(diagnoses),
+        content_type='application/x-ndjson'
+    )
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=InitialPipelineRequestSerializer,
+    responses={200: InitialPipelineResponseSerializer}
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AIServiceThrottle])
+@cache_status_header
+@ai_error_handler
+async def initial_pipeline(request):
+    """
+    Generate clarifying questions, specialist recommendations and initial
+    diagnoses in a single request.
+    """
+    serializer = InitialPipelineRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    patient_data = serializer.validated_data['patient_data']
+    language = serializer.validated_data.get('language', 'en')
+    
+    result = await gemini.gemini_service.run_initial_pipeline(
+        patient_data=patient_data,
+        language=language
+    )
+    
+    return Response(result)
 
 
 @swagger_auto_schema(
@@ -186,7 +320,9 @@ def generate_initial_diagnoses(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def generate_final_report(request):
+@cache_status_header
+@ai_error_handler
+async def generate_final_report(request):
     """
     Generate final medical report.
     """
@@ -195,37 +331,49 @@ def generate_final_report(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        patient_data = serializer.validated_data['patient_data']
-        debate_history = serializer.validated_data['debate_history']
-        diagnoses = serializer.validated_data['diagnoses']
-        language = serializer.validated_data.get('language', 'en')
-        
-        report = gemini_service.generate_final_report(
-            patient_data=patient_data,
-            debate_history=debate_history,
-            diagnoses=diagnoses,
-            language=language
-        )
-        
-        return Response(report)
-    
-    except ValueError as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Validation error: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error in AI service: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Service temporarily unavailable. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    patient_data = serializer.validated_data['patient_data']
+    debate_history = serializer.validated_data['debate_history']
+    diagnoses = serializer.validated_data['diagnoses']
+    language = serializer.validated_data.get('language', 'en')
+    
+    report = await gemini.gemini_service.generate_final_report(
+        patient_data=patient_data,
+        debate_history=debate_history,
+        diagnoses=diagnoses,
+        language=language
+    )
+    
+    return Response(report)
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=FinalReportRequestSerializer,
+    responses={200: 'Server-sent events: one "section" event per report field, then "done"'}
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AIServiceThrottle])
+async def stream_final_report(request):
+    """
+    Stream the final medical report as server-sent events, one per completed section.
+    """
+    serializer = FinalReportRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    sections = gemini.gemini_service.stream_final_report(
+        patient_data=serializer.validated_data['patient_data'],
+        debate_history=serializer.validated_data['debate_history'],
+        diagnoses=serializer.validated_data['diagnoses'],
+        language=serializer.validated_data.get('language', 'en')
+    )
+    
+    response = StreamingHttpResponse(_sse_stream(sections), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx hold events back
+    return response
 
 
 @swagger_auto_schema(
@@ -236,7 +384,9 @@ def generate_final_report(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def check_drug_interactions(request):
+@cache_status_header
+@ai_error_handler
+async def check_drug_interactions(request):
     """
     Check for drug interactions.
     """
@@ -245,33 +395,51 @@ def check_drug_interactions(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        medications = serializer.validated_data['medications']
-        language = serializer.validated_data.get('language', 'en')
-        
-        interactions = gemini_service.check_drug_interactions(
-            medications=medications,
-            language=language
-        )
-        
-        return Response({'interactions': interactions})
-    
-    except ValueError as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Validation error: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error in AI service: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Service temporarily unavailable. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    medications = serializer.validated_data['medications']
+    language = serializer.validated_data.get('language', 'en')
+    
+    interactions = await gemini.gemini_service.check_drug_interactions(
+        medications=medications,
+        language=language,
+        batch_key=request.user.pk
+    )
+    
+    return Response({'interactions': interactions})
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=DrugInteractionBatchRequestSerializer,
+    responses={200: DrugInteractionBatchResponseSerializer}
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([AIServiceThrottle])
+@cache_status_header
+@ai_error_handler
+async def check_drug_interactions_batch(request):
+    """
+    Check drug interactions for several medication sets in one call.
+    """
+    serializer = DrugInteractionBatchRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    medication_sets = serializer.validated_data['medication_sets']
+    language = serializer.validated_data.get('language', 'en')
+    
+    interactions_by_set = await gemini.gemini_service.check_drug_interactions_batch(
+        medication_sets=medication_sets,
+        language=language
+    )
+    
+    return Response({
+        'results': [
+            {'index': index, 'interactions': interactions}
+            for index, interactions in enumerate(interactions_by_set)
+        ]
+    })
 
 
 @swagger_auto_schema(
@@ -282,7 +450,9 @@ def check_drug_interactions(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 @throttle_classes([AIServiceThrottle])
-def suggest_cme_topics(request):
+@cache_status_header
+@ai_error_handler
+async def suggest_cme_topics(request):
     """
     Suggest CME topics based on user's case history.
     """
@@ -291,30 +461,13 @@ def suggest_cme_topics(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    try:
-        analyses = serializer.validated_data['analyses']
-        language = serializer.validated_data.get('language', 'en')
-        
-        topics = gemini_service.suggest_cme_topics(
-            analyses=analyses,
-            language=language
-        )
-        
-        return Response({'topics': topics})
-    
-    except ValueError as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.warning(f"Validation error: {str(e)}")
-        return Response(
-            {'error': 'Invalid input data. Please check your request.'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error in AI service: {str(e)}", exc_info=True)
-        return Response(
-            {'error': 'Service temporarily unavailable. Please try again later.'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    analyses = serializer.validated_data['analyses']
+    language = serializer.validated_data.get('language', 'en')
+    
+    topics = await gemini.gemini_service.suggest_cme_topics(
+        analyses=analyses,
+        language=language
+    )
+    
+    return Response({'topics': topics})
+
@@ -5,3 +5,6 @@ class AnalysesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.analyses'
     verbose_name = 'Analyses'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
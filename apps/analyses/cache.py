@@ -0,0 +1,25 @@
+"""
+Cache keys for per-user analysis data.
+"""
+from django.core.cache import cache
+
+
+DASHBOARD_CACHE_TIMEOUT = 300  # seconds; entries are also dropped when analyses change
+
+# Bump when the cached dashboard data or response shape changes
+DASHBOARD_CACHE_VERSION = 2
+
+# Dashboard data parts cached and invalidated independently; the rendered
+# response built from them is cached under the 'response' part. Common
+# diagnoses are precomputed in DashboardSummary instead.
+DASHBOARD_PARTS = ('recent',)
+
+
+def dashboard_cache_key(user_id, part):
+    """Return the cache key for one part of a user's dashboard statistics."""
+    return f'analytics:dashboard:v{DASHBOARD_CACHE_VERSION}:{user_id}:{part}'
+
+
+def invalidate_dashboard(user_id, parts=DASHBOARD_PARTS):
+    """Drop the given parts (by default all) of a user's dashboard, and its rendered response."""
+    cache.delete_many([dashboard_cache_key(user_id, part) for part in (*parts, 'response')])
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caselibrary',
+            index=models.Index(fields=['is_public', '-created_at'], name='analyses_ca_is_publ_b0def7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cmetopic',
+            index=models.Index(fields=['user', '-created_at'], name='analyses_cm_user_id_9847bc_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+"""
+Store the large JSON columns of analyses with lz4 TOAST compression.
+
+jsonb values above ~2KB are already compressed out of line by TOAST, but with
+pglz by default; lz4 decompresses several times faster, which is what list and
+dashboard reads pay for. Only rows written after the migration are recompressed.
+Requires PostgreSQL 14+ built with lz4; other databases are left untouched.
+"""
+from django.db import migrations, transaction
+from django.db.utils import NotSupportedError
+
+
+LARGE_JSON_COLUMNS = ('patient_data', 'debate_history', 'final_report', 'differential_diagnoses')
+
+
+def set_compression(method):
+    def apply(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql' or connection.pg_version < 140000:
+            return
+        
+        table = schema_editor.quote_name(apps.get_model('analyses', 'Analysis')._meta.db_table)
+        try:
+            with transaction.atomic(using=connection.alias):
+                for column in LARGE_JSON_COLUMNS:
+                    schema_editor.execute(
+                        f'ALTER TABLE {table} ALTER COLUMN {schema_editor.quote_name(column)} '
+                        f'SET COMPRESSION {method}'
+                    )
+        except NotSupportedError:
+            # Server built without lz4; keep the default compression
+            pass
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0003_case_library_and_cme_topic_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_compression('lz4'), set_compression('pglz')),
+    ]
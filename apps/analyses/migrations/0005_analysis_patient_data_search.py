@@ -0,0 +1,40 @@
+"""
+Full-text search over the string values of Analysis.patient_data.
+
+Adds a stored generated tsvector column with a GIN index, so the list search
+is an index lookup instead of a LIKE scan over every patient_data document.
+The 'simple' configuration is used because patient data is written in several
+languages and should not be stemmed as English. PostgreSQL only; other
+databases keep searching with icontains.
+"""
+from django.db import migrations
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE analyses_analysis ADD COLUMN patient_data_tsv tsvector "
+        "GENERATED ALWAYS AS (jsonb_to_tsvector('simple'::regconfig, patient_data, '[\"string\"]')) STORED"
+    )
+    schema_editor.execute(
+        "CREATE INDEX analyses_analysis_patient_data_tsv_gin "
+        "ON analyses_analysis USING gin (patient_data_tsv)"
+    )
+
+
+def remove_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("ALTER TABLE analyses_analysis DROP COLUMN patient_data_tsv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0004_analysis_json_lz4_compression'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
@@ -0,0 +1,42 @@
+"""
+Trigram indexes for the case library search.
+
+CaseLibraryViewSet.search ORs icontains filters over tags, final_diagnosis and
+outcome, which Django renders as UPPER(col::text) LIKE UPPER('%query%') on
+PostgreSQL. A btree index cannot serve a leading-wildcard LIKE; a pg_trgm GIN
+index over the same UPPER(col::text) expression can. PostgreSQL only.
+"""
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_COLUMNS = ('tags', 'final_diagnosis', 'outcome')
+
+
+def add_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX analyses_caselibrary_{column}_trgm "
+            f"ON analyses_caselibrary USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS analyses_caselibrary_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0005_analysis_patient_data_search'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0006_case_library_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='analysis',
+            name='analyses_an_user_id_bca6d5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='analyses_an_user_id_2b0e09_idx'),
+        ),
+    ]
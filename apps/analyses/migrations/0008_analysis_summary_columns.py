@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:16
+
+import django.db.models.fields.json
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0007_analysis_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='patient_name',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Trim(django.db.models.functions.text.Concat(django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('firstName', 'patient_data'), models.Value(''), output_field=models.TextField()), models.Value(' '), django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('lastName', 'patient_data'), models.Value(''), output_field=models.TextField()), output_field=models.TextField())), output_field=models.TextField(), verbose_name='patient name'),
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='primary_diagnosis',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.IsNull(django.db.models.functions.comparison.Cast(django.db.models.fields.json.KeyTransform(0, django.db.models.fields.json.KeyTransform('consensusDiagnosis', 'final_report')), models.TextField()), True), then=None), default=django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('name', django.db.models.fields.json.KeyTransform(0, django.db.models.fields.json.KeyTransform('consensusDiagnosis', 'final_report'))), models.Value(''), output_field=models.TextField())), output_field=models.TextField(null=True), verbose_name='primary diagnosis'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0008_analysis_summary_columns'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_summary', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('common_diagnoses', models.JSONField(default=list, verbose_name='common diagnoses')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'dashboard summary',
+                'verbose_name_plural': 'dashboard summaries',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+"""
+Trigram index for substring search on Analysis.patient_name.
+
+Django renders patient_name__icontains as UPPER(patient_name::text) LIKE
+UPPER('%query%') on PostgreSQL, so the index is built over that expression.
+Relies on the pg_trgm extension enabled in 0006. PostgreSQL only.
+"""
+from django.db import migrations
+
+
+def add_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX analyses_analysis_patient_name_trgm "
+        "ON analyses_analysis USING gin ((UPPER(patient_name::text)) gin_trgm_ops)"
+    )
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS analyses_analysis_patient_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0009_dashboard_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigram_index, remove_trigram_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0010_analysis_patient_name_trigram_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['user', '-created_at', '-id'], name='analysis_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-14 05:34
+"""
+Rebuild the summary columns so JSON null reads as '' on SQLite too.
+
+Django cannot alter a GeneratedField's expression, so each column is dropped
+and added again. Dropping patient_name drops its PostgreSQL trigram index
+(0010), which is rebuilt afterwards.
+"""
+
+import django.db.models.fields.json
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+def add_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS analyses_analysis_patient_name_trgm "
+        "ON analyses_analysis USING gin ((UPPER(patient_name::text)) gin_trgm_ops)"
+    )
+
+
+def remove_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS analyses_analysis_patient_name_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyses', '0011_analysis_completed_index'),
+    ]
+
+    operations = [
+        # Restores the index on the old column when migrating backwards
+        migrations.RunPython(migrations.RunPython.noop, add_trigram_index),
+        migrations.RemoveField(
+            model_name='analysis',
+            name='patient_name',
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='patient_name',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Trim(django.db.models.functions.text.Concat(models.Case(models.When(models.Q(('patient_data__firstName', None)), then=models.Value('')), default=django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('firstName', 'patient_data'), models.Value('')), output_field=models.TextField()), models.Value(' '), models.Case(models.When(models.Q(('patient_data__lastName', None)), then=models.Value('')), default=django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('lastName', 'patient_data'), models.Value('')), output_field=models.TextField()), output_field=models.TextField())), output_field=models.TextField(), verbose_name='patient name'),
+        ),
+        migrations.RemoveField(
+            model_name='analysis',
+            name='primary_diagnosis',
+        ),
+        migrations.AddField(
+            model_name='analysis',
+            name='primary_diagnosis',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.IsNull(django.db.models.functions.comparison.Cast(django.db.models.fields.json.KeyTransform(0, django.db.models.fields.json.KeyTransform('consensusDiagnosis', 'final_report')), models.TextField()), True), then=None), default=models.Case(models.When(models.Q(('final_report__consensusDiagnosis__0__name', None)), then=models.Value('')), default=django.db.models.functions.comparison.Coalesce(django.db.models.fields.json.KeyTextTransform('name', django.db.models.fields.json.KeyTextTransform('0', django.db.models.fields.json.KeyTextTransform('consensusDiagnosis', 'final_report'))), models.Value('')), output_field=models.TextField())), output_field=models.TextField(null=True), verbose_name='primary diagnosis'),
+        ),
+        migrations.RunPython(add_trigram_index, remove_trigram_index),
+    ]
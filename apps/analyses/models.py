@@ -1,8 +1,118 @@
-from django.db import models
+import re
+from collections import Counter
+
+from django.contrib.postgres.search import SearchQuery, SearchVectorField
+from django.db import connections, models
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast, Coalesce, Concat, Trim
+from django.db.models.lookups import IsNull
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 
+_SEARCH_WORD_RE = re.compile(r'\w+')
+
+_FIRST_CONSENSUS = KeyTransform(0, KeyTransform('consensusDiagnosis', 'final_report'))
+
+
+def _json_text(field, *path):
+    """
+    Text of a JSON value, '' when it is missing or JSON null.
+    
+    SQLite renders JSON null as 'null' where PostgreSQL gives SQL NULL, so nulls
+    are matched explicitly to give the same column on both.
+    """
+    lookup = '__'.join((field, *path))
+    return models.Case(
+        models.When(models.Q(**{lookup: None}), then=Value('')),
+        default=Coalesce(KeyTextTransform.from_lookup(lookup), Value('')),
+        output_field=models.TextField(),
+    )
+
+# Count consensus diagnosis names across the final reports of an inner query;
+# other backends count in Python (AnalysisQuerySet._count_diagnoses)
+_COMMON_DIAGNOSES_SQL = {
+    'postgresql': (
+        "SELECT dx ->> 'name', COUNT(*) FROM ({inner}) a "
+        "CROSS JOIN LATERAL jsonb_array_elements(CASE "
+        "WHEN jsonb_typeof(a.final_report -> 'consensusDiagnosis') = 'array' "
+        "THEN a.final_report -> 'consensusDiagnosis' ELSE '[]'::jsonb END) dx "
+        "WHERE jsonb_typeof(dx) = 'object' AND dx ? 'name' "
+        "GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT %s"
+    ),
+    'sqlite': (
+        "SELECT json_extract(dx.value, '$.name'), COUNT(*) FROM ({inner}) a, "
+        "json_each(CASE WHEN json_type(a.final_report, '$.consensusDiagnosis') = 'array' "
+        "THEN json_extract(a.final_report, '$.consensusDiagnosis') ELSE '[]' END) dx "
+        "WHERE dx.type = 'object' AND json_type(dx.value, '$.name') IS NOT NULL "
+        "GROUP BY 1 ORDER BY 2 DESC, 1 LIMIT %s"
+    ),
+}
+
+
+class AnalysisQuerySet(models.QuerySet):
+    """QuerySet helpers for analyses."""
+    
+    def search(self, text):
+        """
+        Filter to analyses whose patient name contains text, or whose patient data contains every word of it.
+        
+        On PostgreSQL both halves are index-backed: the name through a trigram index
+        (migration 0010), so any substring matches, and the patient data through the
+        patient_data_tsv column (migration 0005), matching words by prefix.
+        """
+        words = _SEARCH_WORD_RE.findall(text.lower())
+        if connections[self.db].vendor != 'postgresql' or not words:
+            return self.filter(patient_data__icontains=text)
+        
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config='simple', search_type='raw')
+        return self.alias(
+            patient_data_tsv=RawSQL('"analyses_analysis"."patient_data_tsv"', [], output_field=SearchVectorField())
+        ).filter(models.Q(patient_name__icontains=text) | models.Q(patient_data_tsv=query))
+    
+    def common_diagnoses(self, limit=5):
+        """
+        Return the most frequent consensus diagnoses as ``{'name', 'count'}`` dicts.
+        
+        The final reports are unpacked and counted in the database, so none of
+        them are loaded into Python.
+        """
+        connection = connections[self.db]
+        sql = _COMMON_DIAGNOSES_SQL.get(connection.vendor)
+        if sql is None:
+            return self._count_diagnoses(limit)
+        inner, params = self.order_by().values('final_report').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(inner=inner), (*params, limit))
+            return [{'name': name, 'count': count} for name, count in cursor.fetchall()]
+    
+    def _count_diagnoses(self, limit):
+        """common_diagnoses() in Python, for backends without JSON set functions."""
+        counts = Counter()
+        for final_report in self.order_by().values_list('final_report', flat=True).iterator():
+            consensus = final_report.get('consensusDiagnosis') if isinstance(final_report, dict) else None
+            if isinstance(consensus, list):
+                counts.update(dx['name'] for dx in consensus if isinstance(dx, dict) and 'name' in dx)
+        # Same order as the SQL: most frequent first, ties by name
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+        return [{'name': name, 'count': count} for name, count in ranked[:limit]]
+    
+    def summaries(self):
+        """Load only what AnalysisListSerializer renders, leaving the JSON blobs in the database."""
+        return self.select_related('user').only(
+            'id', 'user__name', 'patient_id', 'patient_name', 'primary_diagnosis', 'is_completed', 'created_at'
+        )
+    
+    def summary_values(self):
+        """Like summaries(), but as plain dicts for AnalysisSummarySerializer, skipping model instances."""
+        return self.values(
+            'id', 'patient_id', 'patient_name', 'primary_diagnosis', 'is_completed', 'created_at',
+            user_name=models.F('user__name')
+        )
+
+
 class Analysis(models.Model):
     """Model for storing patient analysis records."""
     
@@ -32,6 +142,30 @@ class Analysis(models.Model):
     follow_up_history = models.JSONField(_('follow-up history'), default=list)
     detected_medications = models.JSONField(_('detected medications'), null=True, blank=True)
     
+    # Summary columns, kept in sync with the JSON by the database
+    patient_name = models.GeneratedField(
+        expression=Trim(Concat(
+            _json_text('patient_data', 'firstName'),
+            Value(' '),
+            _json_text('patient_data', 'lastName'),
+            output_field=models.TextField(),
+        )),
+        output_field=models.TextField(),
+        db_persist=True,
+        verbose_name=_('patient name')
+    )
+    # Name of the first consensus diagnosis: NULL while consensusDiagnosis has no first
+    # entry (missing, empty or not a list), '' if that entry has no name (or is not an object)
+    primary_diagnosis = models.GeneratedField(
+        expression=models.Case(
+            models.When(IsNull(Cast(_FIRST_CONSENSUS, models.TextField()), True), then=None),
+            default=_json_text('final_report', 'consensusDiagnosis', '0', 'name'),
+        ),
+        output_field=models.TextField(null=True),
+        db_persist=True,
+        verbose_name=_('primary diagnosis')
+    )
+    
     # Status
     is_completed = models.BooleanField(_('is completed'), default=False)
     
@@ -39,25 +173,26 @@ class Analysis(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AnalysisQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('analysis')
         verbose_name_plural = _('analyses')
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', '-created_at']),
+            # Keyset pagination of a user's analyses, see AnalysisCursorPagination
+            models.Index(fields=['user', '-created_at', '-id']),
+            # Completed analyses only (dashboard summaries, is_completed=true list filter)
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                name='analysis_completed_idx',
+                condition=models.Q(is_completed=True),
+            ),
             models.Index(fields=['patient_id']),
         ]
     
     def __str__(self):
         return f"Analysis #{self.id} - {self.patient_id} ({self.created_at.date()})"
-    
-    def save(self, *args, **kwargs):
-        """Override save to update user statistics."""
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        if is_new:
-            self.user.update_stats()
 
 
 class CaseLibrary(models.Model):
@@ -88,6 +223,10 @@ class CaseLibrary(models.Model):
         verbose_name = _('case library entry')
         verbose_name_plural = _('case library entries')
         ordering = ['-created_at']
+        indexes = [
+            # Public cases, newest first (the shared half of the library queryset)
+            models.Index(fields=['is_public', '-created_at']),
+        ]
     
     def __str__(self):
         return f"Case #{self.id} - {self.final_diagnosis[:50]}"
@@ -115,6 +254,45 @@ class CMETopic(models.Model):
         verbose_name = _('CME topic')
         verbose_name_plural = _('CME topics')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.topic} - {self.user.name}"
+
+
+class DashboardSummary(models.Model):
+    """Precomputed dashboard statistics, refreshed in the background when a user's analyses change."""
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='dashboard_summary',
+        verbose_name=_('user')
+    )
+    
+    common_diagnoses = models.JSONField(_('common diagnoses'), default=list)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('dashboard summary')
+        verbose_name_plural = _('dashboard summaries')
+    
+    def __str__(self):
+        return f"Dashboard summary for user #{self.user_id}"
+    
+    @classmethod
+    def refresh(cls, user_id):
+        """Recompute a user's summary from their completed analyses."""
+        summary, created = cls.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'common_diagnoses': Analysis.objects.filter(
+                    user_id=user_id, is_completed=True
+                ).common_diagnoses(limit=5),
+            }
+        )
+        return summary
@@ -0,0 +1,29 @@
+"""
+Pagination for analysis lists.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class AnalysisCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a user's analyses.
+    
+    Each page continues from the last (created_at, id) seen, which the
+    (user, -created_at, -id) index serves as a range scan, instead of reading
+    and discarding every earlier row as LIMIT/OFFSET does.
+    """
+    
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    
+    # Orderings the index can serve, keyed by the ``ordering`` query param
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        'created_at': ('created_at', 'id'),
+    }
+    
+    def get_ordering(self, request, queryset, view):
+        """Return the requested ordering if it is indexed, else the default."""
+        return self.orderings.get(request.query_params.get('ordering'), self.ordering)
@@ -1,12 +1,21 @@
 from rest_framework import serializers
 from .models import Analysis, CaseLibrary, CMETopic
-from .validators import validate_patient_id, validate_json_structure, sanitize_text_input
+from .validators import validate_patient_id, validate_json_structure
 
 
 class AnalysisSerializer(serializers.ModelSerializer):
     """Serializer for Analysis model."""
     
     user_name = serializers.CharField(source='user.name', read_only=True)
+    debate_history = serializers.ListField(
+        child=serializers.JSONField(),
+        max_length=1000,  # Reasonable limit
+        required=False,
+        error_messages={
+            'not_a_list': 'Debate history must be a list.',
+            'max_length': 'Debate history is too large.',
+        }
+    )
     
     class Meta:
         model = Analysis
@@ -38,14 +47,6 @@ class AnalysisSerializer(serializers.ModelSerializer):
         validate_json_structure(value, max_size_mb=5)
         return value
     
-    def validate_debate_history(self, value):
-        """Validate debate history."""
-        if not isinstance(value, list):
-            raise serializers.ValidationError('Debate history must be a list.')
-        if len(value) > 1000:  # Reasonable limit
-            raise serializers.ValidationError('Debate history is too large.')
-        return value
-    
     def create(self, validated_data):
         """Create a new analysis with validation."""
         validated_data['user'] = self.context['request'].user
@@ -54,6 +55,13 @@ class AnalysisSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+def diagnosis_summary(primary_diagnosis):
+    """Describe an analysis by its primary diagnosis column: "In progress", the name, or 'No diagnosis'."""
+    if primary_diagnosis is None:
+        return "In progress"
+    return primary_diagnosis or 'No diagnosis'
+
+
 class AnalysisListSerializer(serializers.ModelSerializer):
     """Lightweight serializer for listing analyses."""
     
@@ -75,20 +83,32 @@ class AnalysisListSerializer(serializers.ModelSerializer):
     
     def get_patient_name(self, obj):
         """Get patient name from patient data."""
-        patient_data = obj.patient_data
-        if isinstance(patient_data, dict):
-            first_name = patient_data.get('firstName', '')
-            last_name = patient_data.get('lastName', '')
-            return f"{first_name} {last_name}".strip()
-        return "Unknown"
+        return obj.patient_name
     
     def get_diagnosis_summary(self, obj):
         """Get summary of diagnoses."""
-        if obj.final_report and isinstance(obj.final_report, dict):
-            consensus = obj.final_report.get('consensusDiagnosis', [])
-            if consensus:
-                return consensus[0].get('name', 'No diagnosis') if isinstance(consensus, list) else 'No diagnosis'
-        return "In progress"
+        return diagnosis_summary(obj.primary_diagnosis)
+
+
+class AnalysisSummarySerializer(serializers.Serializer):
+    """
+    Read-only serializer for AnalysisQuerySet.summary_values() rows.
+    
+    Renders the same fields as AnalysisListSerializer from plain dicts, so list
+    endpoints can skip building model instances.
+    """
+    
+    id = serializers.IntegerField(read_only=True)
+    user_name = serializers.CharField(read_only=True)
+    patient_id = serializers.CharField(read_only=True)
+    patient_name = serializers.CharField(read_only=True)
+    diagnosis_summary = serializers.SerializerMethodField()
+    is_completed = serializers.BooleanField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    
+    def get_diagnosis_summary(self, row):
+        """Get summary of diagnoses."""
+        return diagnosis_summary(row['primary_diagnosis'])
 
 
 class CaseLibrarySerializer(serializers.ModelSerializer):
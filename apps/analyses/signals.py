@@ -0,0 +1,56 @@
+"""
+Signal handlers keeping cached analysis data and user counters fresh.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_dashboard
+from .models import Analysis
+from .tasks import refresh_dashboard_summary
+
+
+def _dashboard_changed(user_id, diagnoses=True):
+    """Invalidate a user's dashboard once the current transaction commits."""
+    def invalidate():
+        invalidate_dashboard(user_id)
+        if diagnoses:
+            refresh_dashboard_summary.delay(user_id)
+    
+    # After commit, so a concurrent request cannot re-cache the old data
+    transaction.on_commit(invalidate)
+
+
+def _count_analyses(user_id, delta):
+    get_user_model().objects.filter(pk=user_id).update(total_analyses=F('total_analyses') + delta)
+
+
+@receiver(post_save, sender=Analysis)
+@receiver(post_delete, sender=Analysis)
+def analysis_changed(sender, instance, created=False, **kwargs):
+    """Invalidate the owner's dashboard when one of their analyses changes."""
+    # Common diagnoses only count completed analyses
+    _dashboard_changed(instance.user_id, diagnoses=not (created and not instance.is_completed))
+
+
+@receiver(post_save, sender=Analysis)
+def analysis_created(sender, instance, created, **kwargs):
+    """Count a new analysis on its owner's row."""
+    if created:
+        _count_analyses(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Analysis)
+def analysis_deleted(sender, instance, **kwargs):
+    """Uncount a deleted analysis from its owner's row."""
+    _count_analyses(instance.user_id, -1)
+
+
+def analyses_bulk_created(user_id, analyses):
+    """Do the signal bookkeeping for analyses inserted with bulk_create, which sends no signals."""
+    if not analyses:
+        return
+    _count_analyses(user_id, len(analyses))
+    _dashboard_changed(user_id, diagnoses=any(analysis.is_completed for analysis in analyses))
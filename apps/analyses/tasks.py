@@ -0,0 +1,25 @@
+"""
+Background tasks for analyses.
+"""
+from celery import shared_task
+from django.contrib.auth import get_user_model
+
+from .cache import invalidate_dashboard
+from .models import DashboardSummary
+
+
+@shared_task
+def refresh_dashboard_summary(user_id):
+    """Recompute a user's dashboard summary. Safe to run repeatedly for the same user."""
+    if not get_user_model().objects.filter(pk=user_id).exists():
+        return
+    DashboardSummary.refresh(user_id)
+    # Drop the response rendered from the previous summary
+    invalidate_dashboard(user_id, parts=())
+
+
+@shared_task
+def refresh_all_dashboard_summaries():
+    """Recompute every user's dashboard summary, correcting any drift."""
+    for user_id in get_user_model().objects.values_list('pk', flat=True).iterator():
+        refresh_dashboard_summary(user_id)
@@ -0,0 +1,351 @@
+"""
+Tests for the analyses API.
+"""
+import json
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncClient
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import models
+from .models import Analysis, CaseLibrary, DashboardSummary
+from .views import BULK_CREATE_LIMIT
+
+
+PATIENT_DATA = {'firstName': 'Ali', 'lastName': 'Valiyev', 'complaints': 'chest pain'}
+
+
+class AnalysisAPITestCase(APITestCase):
+    """Authenticated client for one doctor."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            phone='+998901234567', password='Strong-pass-1', name='Doctor'
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_analysis(self, **kwargs):
+        kwargs.setdefault('patient_id', 'P-1')
+        kwargs.setdefault('patient_data', PATIENT_DATA)
+        return Analysis.objects.create(user=self.user, **kwargs)
+
+
+class BulkCreateTests(AnalysisAPITestCase):
+    """POST /api/analyses/bulk/."""
+
+    url = '/api/analyses/bulk/'
+
+    def test_creates_every_item(self):
+        items = [{'patient_id': f'P-{i}', 'patient_data': PATIENT_DATA} for i in range(3)]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['patient_id'] for item in response.data], ['P-0', 'P-1', 'P-2'])
+        self.assertEqual(Analysis.objects.filter(user=self.user, is_completed=True).count(), 3)
+
+    def test_counts_the_items_on_the_user(self):
+        self.create_analysis()
+        items = [{'patient_id': 'P-2', 'patient_data': PATIENT_DATA}] * 4
+        self.client.post(self.url, items, format='json')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_analyses, 5)
+
+    def test_rejects_more_than_the_limit(self):
+        items = [{'patient_id': 'P-1', 'patient_data': PATIENT_DATA}] * (BULK_CREATE_LIMIT + 1)
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Analysis.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_analyses, 0)
+
+    def test_invalid_item_creates_nothing(self):
+        items = [{'patient_id': 'P-1', 'patient_data': PATIENT_DATA}, {'patient_id': 'bad id!', 'patient_data': {}}]
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Analysis.objects.exists())
+
+
+class CaseLibraryViewTests(AnalysisAPITestCase):
+    """POST /api/analyses/case-library/<pk>/view/."""
+
+    def setUp(self):
+        super().setUp()
+        self.case = CaseLibrary.objects.create(analysis=self.create_analysis(), final_diagnosis='Angina')
+
+    def test_each_view_is_counted(self):
+        url = f'/api/analyses/case-library/{self.case.pk}/view/'
+        self.assertEqual(self.client.post(url).data, {'view_count': 1})
+        self.assertEqual(self.client.post(url).data, {'view_count': 2})
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.view_count, 2)
+
+    def test_non_numeric_pk_is_not_found(self):
+        response = self.client.post('/api/analyses/case-library/abc/view/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_private_case_is_not_found(self):
+        other = get_user_model().objects.create_user(phone='+998907654321', password='Strong-pass-1', name='Other')
+        self.client.force_authenticate(other)
+        response = self.client.post(f'/api/analyses/case-library/{self.case.pk}/view/')
+        self.assertEqual(response.status_code, 404)
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.view_count, 0)
+
+
+class LongitudinalTests(AnalysisAPITestCase):
+    """GET /api/analyses/<pk>/longitudinal/."""
+
+    def setUp(self):
+        super().setUp()
+        self.analyses = [self.create_analysis() for _ in range(3)]
+        self.create_analysis(patient_id='P-2')
+        self.url = f'/api/analyses/{self.analyses[-1].pk}/longitudinal/'
+
+    def assertPatientHistory(self, body):
+        self.assertEqual([row['id'] for row in json.loads(body)], [analysis.pk for analysis in self.analyses])
+
+    def test_streams_from_a_sync_iterator_under_wsgi(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertPatientHistory(b''.join(response.streaming_content))
+
+    async def test_streams_from_an_async_iterator_under_asgi(self):
+        token = AccessToken.for_user(self.user)
+        response = await AsyncClient().get(self.url, headers={'Authorization': f'Bearer {token}'})
+        self.assertTrue(response.is_async)
+        self.assertPatientHistory(b''.join([chunk async for chunk in response.streaming_content]))
+
+    def test_unknown_analysis_is_not_found(self):
+        self.assertEqual(self.client.get('/api/analyses/999999/longitudinal/').status_code, 404)
+
+
+def final_report(*diagnoses):
+    return {'consensusDiagnosis': list(diagnoses)}
+
+
+class CommonDiagnosesTests(AnalysisAPITestCase):
+    """AnalysisQuerySet.common_diagnoses() with the database's JSON functions."""
+
+    def common_diagnoses(self, **kwargs):
+        return Analysis.objects.filter(user=self.user).common_diagnoses(**kwargs)
+
+    def test_counts_every_consensus_entry(self):
+        self.create_analysis(final_report=final_report({'name': 'Angina'}, {'name': 'GERD'}))
+        self.create_analysis(final_report=final_report({'name': 'Angina'}))
+        self.assertEqual(self.common_diagnoses(), [{'name': 'Angina', 'count': 2}, {'name': 'GERD', 'count': 1}])
+
+    def test_ties_are_ordered_by_name_and_limited(self):
+        self.create_analysis(final_report=final_report({'name': 'C'}, {'name': 'A'}, {'name': 'B'}))
+        self.assertEqual(self.common_diagnoses(limit=2), [{'name': 'A', 'count': 1}, {'name': 'B', 'count': 1}])
+
+    def test_skips_malformed_reports(self):
+        self.create_analysis(final_report=None)
+        self.create_analysis(final_report={'consensusDiagnosis': {'name': 'Not a list'}})
+        self.create_analysis(final_report={'consensusDiagnosis': 'Angina'})
+        self.create_analysis(final_report=['not', 'a', 'dict'])
+        self.create_analysis(final_report=final_report({'code': 'I20'}, 'Angina', ['Angina'], {'name': 'GERD'}))
+        self.assertEqual(self.common_diagnoses(), [{'name': 'GERD', 'count': 1}])
+
+    def test_summary_counts_completed_analyses_only(self):
+        self.create_analysis(final_report=final_report({'name': 'Angina'}), is_completed=True)
+        self.create_analysis(final_report=final_report({'name': 'GERD'}))
+        summary = DashboardSummary.refresh(self.user.id)
+        self.assertEqual(summary.common_diagnoses, [{'name': 'Angina', 'count': 1}])
+
+
+@mock.patch.dict(models._COMMON_DIAGNOSES_SQL, clear=True)
+class CommonDiagnosesFallbackTests(CommonDiagnosesTests):
+    """The same counts on a backend without hand-written SQL."""
+
+
+class SummaryColumnTests(AnalysisAPITestCase):
+    """The generated patient_name and primary_diagnosis columns, and their list rendering."""
+
+    def generated(self, **kwargs):
+        analysis = self.create_analysis(**kwargs)
+        return Analysis.objects.values_list('patient_name', 'primary_diagnosis').get(pk=analysis.pk)
+
+    def test_patient_name(self):
+        cases = [
+            ({'firstName': 'Ali', 'lastName': 'Valiyev'}, 'Ali Valiyev'),
+            ({'lastName': 'Valiyev'}, 'Valiyev'),
+            ({'firstName': 'Ali', 'lastName': None}, 'Ali'),
+            ({'complaints': 'chest pain'}, ''),
+        ]
+        for patient_data, patient_name in cases:
+            with self.subTest(patient_data=patient_data):
+                self.assertEqual(self.generated(patient_data=patient_data)[0], patient_name)
+
+    def test_primary_diagnosis(self):
+        cases = [
+            # No consensus yet: rendered as "In progress"
+            (None, None),
+            ({}, None),
+            ({'consensusDiagnosis': []}, None),
+            ({'consensusDiagnosis': {'name': 'Angina'}}, None),
+            ({'consensusDiagnosis': 'Angina'}, None),
+            # A first entry: its name, '' (rendered as "No diagnosis") when it has none
+            (final_report({'name': 'Angina'}, {'name': 'GERD'}), 'Angina'),
+            (final_report({'code': 'I20'}), ''),
+            (final_report({'name': None}), ''),
+            (final_report({'name': ''}), ''),
+            (final_report('Angina'), ''),
+            (final_report(None), ''),
+        ]
+        for report, primary_diagnosis in cases:
+            with self.subTest(final_report=report):
+                self.assertEqual(self.generated(final_report=report)[1], primary_diagnosis)
+
+    def test_list_and_recent_render_the_same_summary(self):
+        self.create_analysis(final_report=final_report({'name': 'Angina'}))
+        self.create_analysis(final_report=final_report({'code': 'I20'}))
+        self.create_analysis()
+        listed = self.client.get('/api/analyses/').data['results']
+        self.assertEqual(
+            [(row['patient_name'], row['diagnosis_summary']) for row in listed],
+            [('Ali Valiyev', 'In progress'), ('Ali Valiyev', 'No diagnosis'), ('Ali Valiyev', 'Angina')]
+        )
+        self.assertEqual(self.client.get('/api/analyses/recent/').data, listed)
+
+
+class TotalAnalysesCounterTests(AnalysisAPITestCase):
+    """User.total_analyses as maintained by the analysis signals."""
+
+    def assertTotal(self, total):
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_analyses, total)
+
+    def test_create_and_delete(self):
+        analyses = [self.create_analysis() for _ in range(3)]
+        self.assertTotal(3)
+        analyses[0].delete()
+        self.assertTotal(2)
+        Analysis.objects.filter(user=self.user).delete()
+        self.assertTotal(0)
+
+    def test_api_create_and_delete(self):
+        response = self.client.post('/api/analyses/', {'patient_id': 'P-1', 'patient_data': PATIENT_DATA}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTotal(1)
+        self.client.delete(f"/api/analyses/{response.data['id']}/")
+        self.assertTotal(0)
+
+    def test_updates_are_not_counted(self):
+        analysis = self.create_analysis()
+        self.client.post(f'/api/analyses/{analysis.pk}/complete/')
+        self.assertTotal(1)
+
+    def test_only_the_owner_is_counted(self):
+        other = get_user_model().objects.create_user(phone='+998907654321', password='Strong-pass-1', name='Other')
+        self.create_analysis()
+        other.refresh_from_db()
+        self.assertEqual(other.total_analyses, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.create_analysis()
+        self.create_analysis()
+        get_user_model().objects.filter(pk=self.user.pk).update(total_analyses=7)
+        call_command('reconcile_user_stats', self.user.pk, stdout=StringIO())
+        self.assertTotal(2)
+
+
+class CursorPaginationTests(AnalysisAPITestCase):
+    """Cursor pagination and the ordering whitelist of the analysis list."""
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [self.create_analysis(patient_id=f'P-{i}').pk for i in range(5)]
+
+    def list_ids(self, url='/api/analyses/', **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']], response.data['next']
+
+    def test_newest_first_by_default(self):
+        self.assertEqual(self.list_ids()[0], self.ids[::-1])
+
+    def test_oldest_first(self):
+        self.assertEqual(self.list_ids(ordering='created_at')[0], self.ids)
+
+    def test_unindexed_ordering_falls_back_to_default(self):
+        for ordering in ('patient_id', '-patient_data', 'user__password'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.list_ids(ordering=ordering)[0], self.ids[::-1])
+
+    def test_pages_follow_the_cursor(self):
+        seen, url = [], '/api/analyses/'
+        params = {'page_size': 2, 'ordering': 'created_at'}
+        while url:
+            ids, url = self.list_ids(url, **params)
+            seen.extend(ids)
+            params = {}
+        self.assertEqual(seen, self.ids)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/analyses/', {'page_size': 1000})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.data['results']), 100)
+        self.assertIsNone(response.data['next'])
+
+
+class DashboardStatsTests(AnalysisAPITestCase):
+    """GET /api/analyses/dashboard-stats/: the cached response, its ETag and invalidation."""
+
+    url = '/api/analyses/dashboard-stats/'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_analysis(final_report=final_report({'name': 'Angina'}), is_completed=True)
+        self.user.refresh_from_db()
+
+    def test_renders_the_stats(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['total_analyses'], 1)
+        self.assertEqual(data['common_diagnoses'], [{'name': 'Angina', 'count': 1}])
+        self.assertEqual([row['diagnosis_summary'] for row in data['recent_analyses']], ['Angina'])
+
+    def test_cached_response_needs_no_queries(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_new_analysis_changes_the_response(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_analysis(final_report=final_report({'name': 'GERD'}), is_completed=True)
+        self.user.refresh_from_db()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        data = json.loads(response.content)
+        self.assertEqual(data['total_analyses'], 2)
+        self.assertEqual(len(data['recent_analyses']), 2)
+
+    def test_deleted_analysis_changes_the_response(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Analysis.objects.filter(user=self.user).delete()
+        self.user.refresh_from_db()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual((data['total_analyses'], data['common_diagnoses'], data['recent_analyses']), (0, [], []))
@@ -1,10 +1,17 @@
 """
 Validators for Analysis app.
 """
+import json
 import re
+
+import orjson
 from django.core.exceptions import ValidationError
 
 
+# Alphanumeric, hyphens, underscores; \Z (unlike $) does not accept a trailing newline
+PATIENT_ID_RE = re.compile(r'\A[A-Za-z0-9_\-]+\Z')
+
+
 def validate_patient_id(value):
     """Validate patient ID format."""
     if not value or not isinstance(value, str):
@@ -13,21 +20,25 @@ def validate_patient_id(value):
     if len(value) > 255:
         raise ValidationError('Patient ID must be 255 characters or less.')
     
-    # Allow alphanumeric, hyphens, underscores
-    if not re.match(r'^[a-zA-Z0-9_-]+$', value):
+    if not PATIENT_ID_RE.match(value):
         raise ValidationError('Patient ID can only contain alphanumeric characters, hyphens, and underscores.')
 
 
 def validate_json_structure(data, required_keys=None, max_size_mb=5):
     """Validate JSON structure and size."""
-    import json
-    
     if not isinstance(data, dict):
         raise ValidationError('Data must be a dictionary.')
     
-    # Check size (approximate)
-    json_str = json.dumps(data)
-    size_mb = len(json_str.encode('utf-8')) / (1024 * 1024)
+    # Check size (approximate) as UTF-8 bytes; orjson serializes straight to bytes
+    try:
+        size_bytes = len(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+    except orjson.JSONEncodeError:
+        # orjson rejects values json accepts, e.g. integers beyond 64 bits
+        try:
+            size_bytes = len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        except (TypeError, ValueError):
+            raise ValidationError('Data must be JSON serializable.')
+    size_mb = size_bytes / (1024 * 1024)
     
     if size_mb > max_size_mb:
         raise ValidationError(f'Data size ({size_mb:.2f} MB) exceeds maximum allowed size ({max_size_mb} MB).')
@@ -49,6 +60,10 @@ def sanitize_text_input(text, max_length=10000):
         text = text[:max_length]
     
     # Remove null bytes and other problematic characters
-    text = text.replace('\x00', '')
+    if '\x00' in text:
+        text = text.replace('\x00', '')
     
-    return text.strip()
+    # Most input is already trimmed, so only strip when an end is whitespace
+    if text[:1].isspace() or text[-1:].isspace():
+        return text.strip()
+    return text
@@ -1,24 +1,92 @@
+import logging
+
+import orjson
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count, Q
-from collections import Counter
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+
+from config.renderers import ORJSONRenderer
 
-from .models import Analysis, CaseLibrary, CMETopic
+from .cache import DASHBOARD_CACHE_TIMEOUT, DASHBOARD_PARTS, dashboard_cache_key
+from .models import Analysis, CaseLibrary, CMETopic, DashboardSummary
+from .pagination import AnalysisCursorPagination
 from .serializers import (
     AnalysisSerializer,
     AnalysisListSerializer,
+    AnalysisSummarySerializer,
     CaseLibrarySerializer,
     CMETopicSerializer,
     DashboardStatsSerializer
 )
+from .signals import analyses_bulk_created
+
+
+logger = logging.getLogger(__name__)
+
+
+def _json_array(rows, serializer):
+    """Encode an iterator of rows as a JSON array, one row at a time."""
+    yield b'['
+    separator = b''
+    try:
+        for row in rows:
+            yield separator + orjson.dumps(serializer.to_representation(row))
+            separator = b','
+    except Exception as e:
+        # Headers are already sent, so the server can only abort the body
+        logger.error(f"Error streaming JSON array: {str(e)}", exc_info=True)
+        raise
+    yield b']'
+
+
+async def _ajson_array(rows, serializer):
+    """Async twin of _json_array, for async iterators."""
+    yield b'['
+    separator = b''
+    try:
+        async for row in rows:
+            yield separator + orjson.dumps(serializer.to_representation(row))
+            separator = b','
+    except Exception as e:
+        logger.error(f"Error streaming JSON array: {str(e)}", exc_info=True)
+        raise
+    yield b']'
+
+
+def _stream_json_array(request, queryset, serializer, chunk_size=200):
+    """
+    Stream a queryset as a JSON array without loading it into memory.
+    
+    Django buffers a sync iterator fully under ASGI and an async one under
+    WSGI, so the iterator matches the server handling the request.
+    """
+    if isinstance(request._request, ASGIRequest):
+        content = _ajson_array(queryset.aiterator(chunk_size=chunk_size), serializer)
+    else:
+        content = _json_array(queryset.iterator(chunk_size=chunk_size), serializer)
+    return StreamingHttpResponse(content, content_type='application/json')
+
+
+# Most analyses accepted by one bulk create request
+BULK_CREATE_LIMIT = 100
+
+# Query param values read as true; anything else is false
+_BOOL_TRUE = frozenset({'true', 'True', '1', 'yes'})
 
 
 class AnalysisViewSet(viewsets.ModelViewSet):
     """ViewSet for managing analyses with pagination and filtering."""
     
     permission_classes = [IsAuthenticated]
+    pagination_class = AnalysisCursorPagination
     
     def get_serializer_class(self):
         """Return appropriate serializer class."""
@@ -28,40 +96,56 @@ class AnalysisViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Return analyses for the current user with optional filtering."""
+        params = self.request.query_params
         queryset = Analysis.objects.filter(user=self.request.user).select_related('user')
+        if self.action == 'list':
+            queryset = queryset.summaries()
         
         # Filter by completion status
-        is_completed = self.request.query_params.get('is_completed')
+        is_completed = params.get('is_completed')
         if is_completed is not None:
-            queryset = queryset.filter(is_completed=is_completed.lower() == 'true')
+            queryset = queryset.filter(is_completed=is_completed in _BOOL_TRUE)
         
         # Filter by patient_id
-        patient_id = self.request.query_params.get('patient_id')
+        patient_id = params.get('patient_id')
         if patient_id:
             queryset = queryset.filter(patient_id=patient_id)
         
         # Search by patient name (from patient_data JSON)
-        search = self.request.query_params.get('search')
+        search = params.get('search')
         if search:
-            queryset = queryset.filter(patient_data__icontains=search)
-        
-        # Order by date (default: newest first)
-        ordering = self.request.query_params.get('ordering', '-created_at')
-        if ordering:
-            queryset = queryset.order_by(ordering)
+            queryset = queryset.search(search)
         
-        return queryset
+        # Order by date (default: newest first); only indexed orderings are accepted
+        ordering = self.paginator.get_ordering(self.request, queryset, self)
+        return queryset.order_by(*ordering)
     
     def perform_create(self, serializer):
         """Create a new analysis with validation."""
         try:
-            serializer.save(user=self.request.user)
+            # The insert and the owner's counter update commit together
+            with transaction.atomic():
+                serializer.save(user=self.request.user)
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error creating analysis: {str(e)}", exc_info=True)
             raise
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create several analyses with a single INSERT."""
+        serializer = self.get_serializer(data=request.data, many=True, max_length=BULK_CREATE_LIMIT)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic():
+            analyses = Analysis.objects.bulk_create([
+                # Same defaults as AnalysisSerializer.create
+                Analysis(user=request.user, is_completed=True, **item)
+                for item in serializer.validated_data
+            ])
+            analyses_bulk_created(request.user.id, analyses)
+        
+        return Response(self.get_serializer(analyses, many=True).data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """Mark analysis as completed."""
@@ -73,40 +157,22 @@ class AnalysisViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def longitudinal(self, request, pk=None):
-        """Get longitudinal view of patient analyses."""
-        try:
-            analysis = self.get_object()
-            patient_analyses = Analysis.objects.filter(
-                user=request.user,
-                patient_id=analysis.patient_id
-            ).select_related('user').only(
-                'id', 'patient_id', 'patient_data', 'final_report', 
-                'is_completed', 'created_at'
-            ).order_by('created_at')
-            serializer = AnalysisListSerializer(patient_analyses, many=True)
-            return Response(serializer.data)
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error fetching longitudinal view: {str(e)}", exc_info=True)
-            return Response(
-                {'error': 'Failed to fetch longitudinal view'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        """Get longitudinal view of patient analyses, streamed as a JSON array."""
+        analysis = self.get_object()
+        patient_analyses = Analysis.objects.filter(
+            user=request.user,
+            patient_id=analysis.patient_id
+        ).summary_values().order_by('created_at')
+        return _stream_json_array(request, patient_analyses, AnalysisSummarySerializer())
     
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recent analyses with optimized query."""
         try:
-            analyses = self.get_queryset().only(
-                'id', 'patient_id', 'patient_data', 'final_report', 
-                'is_completed', 'created_at'
-            )[:5]
-            serializer = AnalysisListSerializer(analyses, many=True)
+            analyses = self.get_queryset().summary_values()[:5]
+            serializer = AnalysisSummarySerializer(analyses, many=True)
             return Response(serializer.data)
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error fetching recent analyses: {str(e)}", exc_info=True)
             return Response(
                 {'error': 'Failed to fetch recent analyses'},
@@ -123,17 +189,24 @@ class CaseLibraryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Return case library entries."""
         # Users can see their own cases and public cases
+        # The nested analysis is rendered by AnalysisListSerializer, so load only its summary columns
         return CaseLibrary.objects.filter(
             Q(analysis__user=self.request.user) | Q(is_public=True)
-        ).select_related('analysis', 'analysis__user')
+        ).prefetch_related(Prefetch('analysis', queryset=Analysis.objects.summaries()))
     
     @action(detail=True, methods=['post'])
     def view(self, request, pk=None):
         """Increment view count."""
-        case = self.get_object()
-        case.view_count += 1
-        case.save()
-        return Response({'view_count': case.view_count})
+        # A single atomic UPDATE, so concurrent views are never lost
+        try:
+            cases = self.get_queryset().filter(pk=pk)
+            updated = cases.update(view_count=F('view_count') + 1)
+        except (TypeError, ValueError, ValidationError):
+            # A malformed pk, as get_object() would report it
+            raise Http404
+        if not updated:
+            raise Http404
+        return Response({'view_count': cases.values_list('view_count', flat=True).get()})
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -164,8 +237,6 @@ class CaseLibraryViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error in case library search: {str(e)}", exc_info=True)
             return Response(
                 {'error': 'Search failed. Please try again.'},
@@ -197,82 +268,57 @@ class CMETopicViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+def _conditional_json(request, payload):
+    """Respond with rendered JSON and its ETag, or 304 if the client already has it."""
+    response = HttpResponse(payload, content_type='application/json')
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats_view(request):
     """Get dashboard statistics for the user. Optimized with efficient queries."""
-    from django.db.models import Count, Prefetch
-    from django.core.cache import cache
-    
     user = request.user
-    cache_key = f'dashboard_stats_{user.id}'
+    response_key = dashboard_cache_key(user.id, 'response')
+    cache_keys = {part: dashboard_cache_key(user.id, part) for part in DASHBOARD_PARTS}
     
-    # Try to get from cache (5 minute TTL)
-    cached_stats = cache.get(cache_key)
-    if cached_stats:
-        serializer = DashboardStatsSerializer(cached_stats, context={'request': request})
-        return Response(serializer.data)
+    # The rendered JSON is served as is; each data part is also cached separately
+    # (all invalidated by signals when analyses change)
+    cached = cache.get_many([response_key, *cache_keys.values()])
+    if response_key in cached:
+        return _conditional_json(request, cached[response_key])
+    parts = {part: cached[key] for part, key in cache_keys.items() if key in cached}
     
     try:
-        # Optimized query: only fetch necessary fields
-        analyses = Analysis.objects.filter(user=user).only(
-            'id', 'final_report', 'created_at', 'patient_id', 'patient_data'
-        ).order_by('-created_at')
-        
-        total_count = analyses.count()
-        
-        # Efficiently calculate common diagnoses using database aggregation where possible
-        # For JSON fields, we still need Python processing, but we limit the dataset
-        all_diagnoses = []
-        recent_analyses_list = []
-        
-        # Process only completed analyses with final reports (most recent 100 for efficiency)
-        completed_analyses = analyses.filter(is_completed=True)[:100]
-        
-        for analysis in completed_analyses:
-            # Extract diagnoses
-            if analysis.final_report and isinstance(analysis.final_report, dict):
-                consensus = analysis.final_report.get('consensusDiagnosis', [])
-                if isinstance(consensus, list):
-                    for dx in consensus:
-                        if isinstance(dx, dict) and 'name' in dx:
-                            all_diagnoses.append(dx['name'])
-            
-            # Collect recent analyses (limit to 5)
-            if len(recent_analyses_list) < 5:
-                recent_analyses_list.append(analysis)
-        
-        diagnosis_counts = Counter(all_diagnoses)
-        common_diagnoses = [
-            {'name': name, 'count': count}
-            for name, count in diagnosis_counts.most_common(5)
-        ]
-        
-        # Calculate feedback accuracy (placeholder - can be enhanced with actual feedback data)
-        feedback_accuracy = 0.85
+        if 'recent' not in parts:
+            # Only the columns the list serializer renders
+            parts['recent'] = list(
+                Analysis.objects.filter(user=user).summaries().order_by('-created_at')[:5]
+            )
         
-        # Get remaining recent analyses if needed
-        if len(recent_analyses_list) < 5:
-            remaining = list(analyses[:5 - len(recent_analyses_list)])
-            recent_analyses_list.extend(remaining)
-            recent_analyses_list = recent_analyses_list[:5]
+        # Precomputed by a background task; built inline the first time
+        summary = DashboardSummary.objects.filter(user=user).first() or DashboardSummary.refresh(user.id)
         
         stats = {
-            'total_analyses': total_count,
-            'common_diagnoses': common_diagnoses,
-            'feedback_accuracy': feedback_accuracy,
-            'recent_analyses': recent_analyses_list,
+            # Maintained by the analysis signals
+            'total_analyses': user.total_analyses,
+            'common_diagnoses': summary.common_diagnoses,
+            # Placeholder - can be enhanced with actual feedback data
+            'feedback_accuracy': 0.85,
+            'recent_analyses': parts['recent'],
         }
         
-        # Cache for 5 minutes
-        cache.set(cache_key, stats, 300)
-        
         serializer = DashboardStatsSerializer(stats, context={'request': request})
-        return Response(serializer.data)
+        payload = ORJSONRenderer().render(serializer.data)
+        
+        updates = {cache_keys[part]: parts[part] for part in DASHBOARD_PARTS if cache_keys[part] not in cached}
+        updates[response_key] = payload
+        cache.set_many(updates, DASHBOARD_CACHE_TIMEOUT)
+        
+        return _conditional_json(request, payload)
     
     except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
         logger.error(f"Error calculating dashboard stats for user {user.id}: {str(e)}", exc_info=True)
         return Response(
             {'error': 'Failed to calculate dashboard statistics'},
@@ -0,0 +1,28 @@
+"""
+Recount user statistics from the analyses table.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.users.tasks import update_user_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue a recount of total_analyses for every user (or the given user ids). '
+        'The counter is kept current by signals; this repairs drift from bulk writes.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Only recount these users')
+    
+    def handle(self, *args, user_ids, **options):
+        users = get_user_model().objects.order_by('pk')
+        if user_ids:
+            users = users.filter(pk__in=user_ids)
+        
+        count = 0
+        for user_id in users.values_list('pk', flat=True).iterator():
+            update_user_stats.delay(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued stats recount for {count} users'))
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 
@@ -59,7 +60,17 @@ class User(AbstractUser):
         return f"{self.name} ({self.phone})"
     
     def update_stats(self):
-        """Update user statistics."""
+        """
+        Recount user statistics in a single UPDATE, counting analyses in a subquery.
+        
+        total_analyses is kept current by the analysis signals; this repairs drift
+        from writes that skip them (bulk_create, queryset.delete(), raw SQL). The
+        stored row is updated; this instance keeps its loaded values.
+        """
         from apps.analyses.models import Analysis
-        self.total_analyses = Analysis.objects.filter(user=self).count()
-        self.save(update_fields=['total_analyses'])
+        analysis_count = Analysis.objects.filter(user=models.OuterRef('pk')).order_by().values(
+            'user'
+        ).annotate(count=models.Count('*')).values('count')
+        User.objects.filter(pk=self.pk).update(
+            total_analyses=Coalesce(models.Subquery(analysis_count), 0)
+        )
@@ -0,0 +1,16 @@
+"""
+Background tasks for user accounts.
+"""
+from celery import shared_task
+from django.contrib.auth import get_user_model
+
+
+@shared_task
+def update_user_stats(user_id):
+    """Recount a user's statistics. Safe to run repeatedly for the same user."""
+    User = get_user_model()
+    try:
+        user = User.objects.get(pk=user_id)
+    except User.DoesNotExist:
+        return
+    user.update_stats()
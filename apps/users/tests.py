@@ -0,0 +1,105 @@
+"""
+Tests for user accounts: the profile ETag and refresh token revocation.
+"""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.analyses.models import Analysis
+
+from . import tokens
+from .tokens import RefreshToken
+
+
+class UserAPITestCase(APITestCase):
+    """One registered user, with the shared cache cleared around each test."""
+
+    password = 'Strong-pass-1'
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(
+            phone='+998901234567', password=self.password, name='Doctor'
+        )
+
+
+class ProfileETagTests(UserAPITestCase):
+    """GET /api/auth/profile/ with If-None-Match."""
+
+    url = '/api/auth/profile/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_profile_update_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.put('/api/auth/profile/update/', {'name': 'Renamed'}, format='json')
+        self.user.refresh_from_db()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Renamed')
+
+    def test_new_analysis_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # Counted with an F() update, which leaves updated_at as it was
+        Analysis.objects.create(user=self.user, patient_id='P-1', patient_data={})
+        self.user.refresh_from_db()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_analyses'], 1)
+
+
+class RefreshTokenBlacklistTests(UserAPITestCase):
+    """Revocation of refresh tokens through the cache blacklist."""
+
+    refresh_url = '/api/auth/token/refresh/'
+
+    def login(self):
+        response = self.client.post(
+            '/api/auth/login/', {'phone': self.user.phone, 'password': self.password}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['tokens']
+
+    def refresh(self, token):
+        return self.client.post(self.refresh_url, {'refresh': token}, format='json')
+
+    def test_logout_revokes_the_refresh_token(self):
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = self.client.post('/api/auth/logout/', {'refresh_token': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+    def test_rotation_revokes_the_used_token(self):
+        tokens = self.login()
+        response = self.refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_revocation_is_per_token(self):
+        first, second = self.login(), self.login()
+        RefreshToken(first['refresh']).blacklist()
+        self.assertEqual(self.refresh(first['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(second['refresh']).status_code, 200)
+
+    def test_blacklist_entry_expires_with_the_token(self):
+        token = RefreshToken.for_user(self.user)
+        with mock.patch.object(tokens.cache, 'set') as cache_set:
+            token.blacklist()
+        (key, value, timeout), _ = cache_set.call_args
+        self.assertEqual(key, f"jwt:blacklist:{token['jti']}")
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        self.assertAlmostEqual(timeout, lifetime, delta=2)
@@ -0,0 +1,42 @@
+"""
+JWT refresh tokens with a cache-backed blacklist.
+
+The simplejwt token_blacklist app is not installed, so there are no outstanding or
+blacklisted token tables. Revoked tokens are instead recorded in the cache under
+their jti until they would have expired anyway, which makes logout a single cache
+write and the check on refresh a single cache read. The cache must be shared
+between processes (Redis via REDIS_URL) for revocation to hold everywhere.
+"""
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+
+def _blacklist_key(jti):
+    return f'jwt:blacklist:{jti}'
+
+
+class RefreshToken(tokens.RefreshToken):
+    """Refresh token that can be revoked through the cache."""
+    
+    def verify(self):
+        """Also reject tokens that were revoked by logout or rotation."""
+        super().verify()
+        if cache.get(_blacklist_key(self.payload[api_settings.JTI_CLAIM])):
+            raise TokenError(_('Token is blacklisted'))
+    
+    def blacklist(self):
+        """Revoke this token for the rest of its lifetime."""
+        remaining = datetime_from_epoch(self.payload['exp']) - aware_utcnow()
+        timeout = int(remaining.total_seconds()) + 1
+        if timeout > 0:
+            cache.set(_blacklist_key(self.payload[api_settings.JTI_CLAIM]), True, timeout)
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """Refresh serializer that checks and, on rotation, updates the cache blacklist."""
+    
+    token_class = RefreshToken
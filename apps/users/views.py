@@ -2,8 +2,8 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
+from django.views.decorators.http import condition
 
 from .serializers import (
     UserSerializer,
@@ -11,6 +11,7 @@ from .serializers import (
     UserLoginSerializer,
     PasswordChangeSerializer
 )
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -100,10 +101,17 @@ def logout_view(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _profile_etag(request):
+    # total_analyses is bumped with UPDATE ... F(), which leaves updated_at alone
+    user = request.user
+    return f'{user.pk}-{user.updated_at.timestamp()}-{user.total_analyses}'
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@condition(etag_func=_profile_etag)
 def profile_view(request):
-    """Get current user profile."""
+    """Get current user profile. Answers 304 when the client's ETag is current."""
     serializer = UserSerializer(request.user)
     return Response(serializer.data)
 
@@ -0,0 +1,12 @@
+"""
+Celery application for background work moved off the request path.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('konsilium')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -3,6 +3,8 @@
 
 from __future__ import annotations
 
+import copy
+
 try:
     from django.template.context import Context, RequestContext
 except Exception:  # pragma: no cover
@@ -10,82 +12,43 @@ except Exception:  # pragma: no cover
     RequestContext = None  # type: ignore
 
 
-def _safe_context_copy(self: "Context") -> "Context":
-    # If it's a RequestContext, return a plain Context with flattened data to avoid internals
-    try:
-        if RequestContext is not None and isinstance(self, RequestContext):
-            try:
-                flat = {}
-                try:
-                    flat = self.flatten()  # type: ignore[attr-defined]
-                except Exception:
-                    pass
-                new_ctx = Context()
-                try:
-                    new_ctx.update(flat)
-                except Exception:
-                    for k, v in flat.items():
-                        try:
-                            new_ctx[k] = v
-                        except Exception:
-                            pass
-                # Preserve render_context and template if present
-                if hasattr(self, "render_context"):
-                    try:
-                        new_ctx.render_context = self.render_context  # type: ignore[attr-defined]
-                    except Exception:
-                        pass
-                if hasattr(self, "template"):
-                    try:
-                        new_ctx.template = self.template  # type: ignore[attr-defined]
-                    except Exception:
-                        pass
-                return new_ctx
-            except Exception:
-                return self
-    except Exception:
-        pass
+def _context_copy(self: "Context") -> "Context":
+    # Same result as Django's Context.__copy__, without the copy(super()) call that breaks.
+    # Runs on every {% include %}/{% with %} render, so no checks beyond the class dispatch.
+    if self.__class__ is RequestContext:
+        return _request_context_copy(self)
+    new = self.__class__.__new__(self.__class__)
+    new.__dict__.update(self.__dict__)
+    new.dicts = self.dicts[:]
+    new.render_context = copy.copy(self.render_context)
+    return new
 
-    # Create a new instance of the same class without extra kwargs to avoid signature issues
-    try:
-        new = self.__class__()
-    except Exception:
-        # Fallback to base Context
-        try:
-            new = Context()
-        except Exception:
-            return self
 
-    # Shallow copy internal structures if available
-    if hasattr(self, "dicts"):
-        try:
-            new.dicts = list(self.dicts)  # type: ignore[attr-defined]
-        except Exception:
-            pass
-    if hasattr(self, "render_context"):
-        try:
-            new.render_context = self.render_context  # type: ignore[attr-defined]
-        except Exception:
-            pass
+def _request_context_copy(self: "RequestContext") -> "Context":
+    # Slow path: return a plain Context with flattened data to avoid RequestContext internals
+    new_ctx = Context()
+    new_ctx.update(self.flatten())
+    new_ctx.render_context = self.render_context
     if hasattr(self, "template"):
-        try:
-            new.template = self.template  # type: ignore[attr-defined]
-        except Exception:
-            pass
-    return new
+        new_ctx.template = self.template
+    return new_ctx
+
+
+def _copy_is_broken() -> bool:
+    # Checked once: only patch interpreters where Django's own __copy__ fails
+    try:
+        copy.copy(Context())
+    except AttributeError:
+        return True
+    return False
 
 
 def apply():
-    if Context is not None:
-        try:
-            Context.__copy__ = _safe_context_copy  # type: ignore[assignment]
-        except Exception:
-            pass
+    if Context is None or not _copy_is_broken():
+        return
+    Context.__copy__ = _context_copy  # type: ignore[assignment]
     if RequestContext is not None:
-        try:
-            RequestContext.__copy__ = _safe_context_copy  # type: ignore[assignment]
-        except Exception:
-            pass
+        RequestContext.__copy__ = _context_copy  # type: ignore[assignment]
 
 
 # Apply immediately on import
@@ -5,6 +5,7 @@ Django settings for Konsilium project.
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from celery.schedules import crontab
 import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -120,6 +121,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing: Argon2 verifies faster than PBKDF2 at its default cost; existing
+# PBKDF2 hashes keep working and are rehashed with Argon2 on the next login
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
@@ -153,6 +163,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.ORJSONRenderer',
+        # The HTML API browser is a development aid; in production every response is JSON
+        *(('rest_framework.renderers.BrowsableAPIRenderer',) if DEBUG else ()),
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'config.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,  # Increased from 10 for better UX
     'PAGE_SIZE_QUERY_PARAM': 'page_size',
@@ -193,6 +213,9 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
     
     'JTI_CLAIM': 'jti',
+    
+    # Revoked refresh tokens are kept in the cache (see apps.users.tokens)
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.tokens.TokenRefreshSerializer',
 }
 
 # CORS Settings
@@ -210,9 +233,54 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
 ]
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'x-cache',
+]
+
+# Cache Settings (Redis when REDIS_URL is set, local memory otherwise)
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Celery Settings (tasks run inline when no broker is configured)
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL) or 'memory://localhost/'
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=CELERY_BROKER_URL.startswith('memory://'), cast=bool)
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_BEAT_SCHEDULE = {
+    # Nightly drift correction for the signal-refreshed dashboard summaries
+    'refresh-dashboard-summaries': {
+        'task': 'apps.analyses.tasks.refresh_all_dashboard_summaries',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
 
 # Gemini AI Settings
 GEMINI_API_KEY = config('GEMINI_API_KEY', default='')
+GEMINI_CACHE_TIMEOUT = config('GEMINI_CACHE_TIMEOUT', default=3600, cast=int)  # seconds
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = config('GEMINI_CONTEXT_CACHE_MIN_TOKENS', default=32768, cast=int)  # Gemini's minimum cached-content size
+GEMINI_REQUEST_TIMEOUT = config('GEMINI_REQUEST_TIMEOUT', default=120, cast=float)  # seconds per call, including streams
+GEMINI_RATE_LIMIT_PER_MINUTE = config('GEMINI_RATE_LIMIT_PER_MINUTE', default=0, cast=int)  # calls across all workers; 0 disables
+GEMINI_MAX_CONCURRENCY = config('GEMINI_MAX_CONCURRENCY', default=32, cast=int)  # in-flight requests per event loop
+GEMINI_BATCH_WINDOW_MS = config('GEMINI_BATCH_WINDOW_MS', default=0, cast=int)  # extra wait for a user's concurrent checks; 0 adds no latency
+GEMINI_BATCH_MAX_SIZE = config('GEMINI_BATCH_MAX_SIZE', default=16, cast=int)
+
+# Semantic cache for near-duplicate prompts (requires sentence-transformers)
+GEMINI_SEMANTIC_CACHE_ENABLED = config('GEMINI_SEMANTIC_CACHE_ENABLED', default=False, cast=bool)
+GEMINI_SEMANTIC_CACHE_MODEL = config('GEMINI_SEMANTIC_CACHE_MODEL', default='sentence-transformers/all-MiniLM-L6-v2')
+GEMINI_SEMANTIC_CACHE_THRESHOLD = config('GEMINI_SEMANTIC_CACHE_THRESHOLD', default=0.95, cast=float)
+GEMINI_SEMANTIC_CACHE_SIZE = config('GEMINI_SEMANTIC_CACHE_SIZE', default=500, cast=int)  # entries per endpoint
 
 # Security Settings
 if not DEBUG: